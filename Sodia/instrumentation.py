@@ -0,0 +1,180 @@
+"""
+Opt-in per-request cost accounting (``INSTRUMENTATION_ENABLED``).
+
+``InstrumentationMiddleware`` puts a ``RequestMetrics`` in a context variable for the duration of a
+request; every database query (through a connection execute wrapper) and every ``timed()`` block
+adds to it, including ones run on other threads via ``contextvars.copy_context()``. The totals
+are sent back as a ``Server-Timing`` header, logged as one JSON line on the ``sodia.requests``
+logger and fed into per-URL-name latency histograms served by ``metrics_view``.
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import JsonResponse, Http404
+
+logger = logging.getLogger("sodia.requests")
+
+_current_metrics: ContextVar["RequestMetrics | None"] = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    __slots__ = ("timings", "started")
+
+    def __init__(self):
+        self.timings = defaultdict(lambda: [0, 0.0])  # name -> [count, seconds]
+        self.started = time.perf_counter()
+
+    def add(self, name, seconds=0.0):
+        timing = self.timings[name]
+        timing[0] += 1
+        timing[1] += seconds
+
+    def count(self, name):
+        return self.timings[name][0] if name in self.timings else 0
+
+    def seconds(self, name):
+        return self.timings[name][1] if name in self.timings else 0.0
+
+
+def current_metrics() -> RequestMetrics | None:
+    return _current_metrics.get()
+
+
+def record(name, seconds=0.0):
+    """Adds one occurrence of ``name`` (and its duration) to the current request, if instrumented."""
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.add(name, seconds)
+
+
+@contextmanager
+def timed(name):
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - started)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    with timed("db"):
+        return execute(sql, params, many, context)
+
+
+def install_query_wrapper(connection, **kwargs):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+class LatencyHistogram:
+    """The latest ``size`` latencies per URL name; percentiles are computed on read."""
+    SIZE = 1024
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self._samples = defaultdict(lambda: deque(maxlen=self.size))
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self._samples[name].append(seconds)
+
+    def percentiles(self, name):
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return {}
+        return {f"p{p}": samples[max(math.ceil(p / 100 * len(samples)) - 1, 0)] for p in self.PERCENTILES}
+
+    def snapshot(self):
+        with self._lock:
+            names = list(self._samples)
+        return {name: {"count": len(self._samples[name]),
+                       **{key: round(value * 1000, 3) for key, value in self.percentiles(name).items()}}
+                for name in names}
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+histogram = LatencyHistogram()
+
+SERVER_TIMING = (("db", "queries"), ("hash", "password hashes"), ("session_write", "session writes"))
+
+
+class InstrumentationMiddleware:
+    """Goes first in MIDDLEWARE so the total covers (and the query count includes) the other middleware."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "INSTRUMENTATION_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        connection_created.connect(install_query_wrapper)
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current_metrics.set(RequestMetrics())
+        try:
+            return self.finish(request, self.get_response(request))
+        finally:
+            _current_metrics.reset(token)
+
+    async def __acall__(self, request):
+        token = _current_metrics.set(RequestMetrics())
+        try:
+            return self.finish(request, await self.get_response(request))
+        finally:
+            _current_metrics.reset(token)
+
+    @staticmethod
+    def finish(request, response):
+        metrics = _current_metrics.get()
+        total = time.perf_counter() - metrics.started
+        match = getattr(request, "resolver_match", None)
+        url_name = match.view_name if match is not None else "<unresolved>"
+        histogram.add(url_name, total)
+
+        response["Server-Timing"] = ", ".join(
+            [f'{name};dur={metrics.seconds(name) * 1000:.2f};desc="{metrics.count(name)} {label}"'
+             for name, label in SERVER_TIMING if name in metrics.timings]
+            + [f"total;dur={total * 1000:.2f}"])
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "url_name": url_name,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 3),
+            **{f"{name}_count": count for name, (count, _) in metrics.timings.items()},
+            **{f"{name}_ms": round(seconds * 1000, 3) for name, (_, seconds) in metrics.timings.items()},
+        }))
+        return response
+
+
+def metrics_view(request):
+    if not getattr(settings, "INSTRUMENTATION_ENABLED", False):
+        raise Http404
+    return JsonResponse(histogram.snapshot())
@@ -1,6 +1,11 @@
 from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+
 
 class IntFlagField(models.IntegerField):
+    # composite values are only precomputed up to this many distinct bits (2 ** n table entries)
+    MAX_TABLE_BITS = 12
+
     def __init__(self, enum_class, exclusive_choices=False, *args, **kwargs):
         self.enum_class = enum_class
         choices = []
@@ -9,8 +14,25 @@ class IntFlagField(models.IntegerField):
             choices.append((e.value, e.name.lower()))
         if exclusive_choices:
             kwargs.setdefault('choices', choices)
+        self.members = self.member_table(enum_class)
         super().__init__(*args, **kwargs)
 
+    @classmethod
+    def member_table(cls, enum_class):
+        """value -> member for every member and every combination of the enum's bits."""
+        all_bits = 0
+        for e in enum_class:
+            all_bits |= e.value
+        if all_bits.bit_count() > cls.MAX_TABLE_BITS:
+            return {e.value: e for e in enum_class}
+        table = {}
+        subset = all_bits
+        while True:  # walk every submask of all_bits, down to 0
+            table[subset] = enum_class(subset)
+            if not subset:
+                return table
+            subset = (subset - 1) & all_bits
+
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
         kwargs['enum_class'] = self.enum_class
@@ -19,14 +41,62 @@ class IntFlagField(models.IntegerField):
     def from_db_value(self, value, expression, connection):
         if value is None:
             return value
-        return self.enum_class(value)
+        member = self.members.get(value)
+        return self.enum_class(value) if member is None else member
 
     def to_python(self, value):
         if isinstance(value, self.enum_class) or value is None:
             return value
-        return self.enum_class(value)
+        member = self.members.get(value)
+        return self.enum_class(value) if member is None else member
 
     def get_prep_value(self, value):
         if value is None:
             return None
         return int(value)
+
+
+@IntFlagField.register_lookup
+class HasAny(models.Lookup):
+    """``field__has_any=flags``: at least one of the bits is set, as ``(field & flags) != 0`` in SQL."""
+    lookup_name = 'has_any'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'({lhs} & {rhs}) != 0', (*lhs_params, *rhs_params)
+
+
+@IntFlagField.register_lookup
+class HasAll(models.Lookup):
+    """``field__has_all=flags``: every one of the bits is set, as ``(field & flags) = flags`` in SQL."""
+    lookup_name = 'has_all'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'({lhs} & {rhs}) = {rhs}', (*lhs_params, *rhs_params, *rhs_params)
+
+
+class BitSetField(models.BigIntegerField):
+    """A fixed-width set of small integers stored as one BIGINT, bit ``i`` set when ``i`` is a member."""
+    MAX_WIDTH = 63  # the sign bit is left alone so every set is a non-negative value
+
+    def __init__(self, width=MAX_WIDTH, *args, **kwargs):
+        if not 0 < width <= self.MAX_WIDTH:
+            raise ValueError(f"width must be between 1 and {self.MAX_WIDTH}")
+        self.width = width
+        kwargs.setdefault('default', 0)
+        super().__init__(*args, **kwargs)
+        self.validators.append(MaxValueValidator((1 << width) - 1))
+        self.validators.append(MinValueValidator(0))
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.width != self.MAX_WIDTH:
+            kwargs['width'] = self.width
+        return name, path, args, kwargs
+
+
+BitSetField.register_lookup(HasAny)
+BitSetField.register_lookup(HasAll)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Sodia.instrumentation.InstrumentationMiddleware',  # per-request cost accounting, see INSTRUMENTATION_ENABLED
     'django.middleware.security.SecurityMiddleware',  # DEFAULT (HSTS & security)
     # 'django.contrib.sessions.middleware.SessionMiddleware',     REMOVED DEFAULT (session management)
     'django.middleware.common.CommonMiddleware',  # DEFAULT (basic HTTP behaviour)
@@ -60,12 +62,19 @@ TEMPLATES = [
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 # 'django.contrib.auth.context_processors.auth',          REMOVED DEFAULT (auth)
                 # 'django.contrib.messages.context_processors.messages',  REMOVED DEFAULT (messages)
+                'users.context_processors.auth',  # request.auth and auth_cache_key for {% cache %}
+            ],
+            # compiled templates are kept in memory; with DEBUG they are still reloaded when the files change
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
@@ -76,13 +85,90 @@ WSGI_APPLICATION = 'Sodia.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SODIA_DB_ENGINE=sqlite (default) or postgresql, the rest of the connection from SODIA_DB_* variables.
+
+DB_ENGINE = os.environ.get('SODIA_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('SODIA_DB_NAME', 'sodia'),
+            'USER': os.environ.get('SODIA_DB_USER', 'sodia'),
+            'PASSWORD': os.environ.get('SODIA_DB_PASSWORD', ''),
+            'HOST': os.environ.get('SODIA_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('SODIA_DB_PORT', '5432'),
+            # connections come from psycopg's pool (needs psycopg[pool]), which requires CONN_MAX_AGE = 0
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('SODIA_DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('SODIA_DB_POOL_MAX', 10)),
+                    'timeout': float(os.environ.get('SODIA_DB_POOL_TIMEOUT', 10)),
+                },
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SODIA_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # persistent connections, so the PRAGMAs below run once per connection rather than per request
+            'CONN_MAX_AGE': int(os.environ.get('SODIA_DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # take the write lock at BEGIN, so transactions never fail upgrading a read lock
+                'transaction_mode': 'IMMEDIATE',
+                # WAL lets readers run alongside the single writer; NORMAL sync is safe with WAL;
+                # busy_timeout is how long (ms) to wait for the write lock before "database is locked"
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout=20000;'
+                    'PRAGMA mmap_size=134217728;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
     }
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Caches
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+# 'default' is this process's memory. 'shared' is seen by every worker and holds whatever must not go
+# stale per process (privacy masks, version counters, throttles): SODIA_CACHE=file (default, one host),
+# db (run `manage.py createcachetable`) or redis (SODIA_CACHE_LOCATION=redis://...).
+
+SHARED_CACHE = os.environ.get('SODIA_CACHE', 'file')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('SODIA_CACHE_LOCATION', BASE_DIR / '.cache'),
+        },
+        'db': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': os.environ.get('SODIA_CACHE_LOCATION', 'sodia_cache'),
+        },
+        'redis': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('SODIA_CACHE_LOCATION', 'redis://127.0.0.1:6379'),
+        },
+    }[SHARED_CACHE],
 }
 
+# Tests swap every alias above for an in-process cache (see Sodia.testing).
+
+TEST_RUNNER = 'Sodia.testing.TestRunner'
+
 # Password validation    REMOVED DEFAULT (password validation)
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -121,3 +207,126 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+
+# `manage.py collectstatic` writes content-hashed copies (plus .gz/.br variants) here; without DEBUG
+# they are served by Sodia.storage.serve_static (see Sodia/urls.py) unless a web server takes over.
+# Run collectstatic on every deploy: without DEBUG, {% static %} fails for files missing from its
+# manifest. DEBUG uses the unhashed names, and tests swap in plain StaticFilesStorage (Sodia.testing).
+
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'Sodia.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Sessions
+# Seconds between writes of a session's last_request_at / expires_at; page views in between are read-only.
+
+SESSION_TOUCH_THRESHOLD = 300
+
+# Buffer touches in memory and write them in bulk every SESSION_TOUCH_FLUSH_INTERVAL seconds (and at shutdown).
+
+SESSION_TOUCH_BUFFERED = False
+
+SESSION_TOUCH_FLUSH_INTERVAL = 30
+
+# Alias in CACHES shared by all workers for token -> session lookups (None: in-process LRU only).
+
+SESSION_CACHE_BACKEND = None
+
+SESSION_CACHE_SIZE = 10000
+
+# Seconds a worker may serve a session from its own LRU before re-checking the shared cache / database.
+
+SESSION_CACHE_TTL = 30
+
+# Password hashing pool (None: one worker per CPU). Requests beyond workers + queue wait up to
+# PASSWORD_HASHING_QUEUE_TIMEOUT seconds and then fail with users.hashing.HashingBusy.
+
+PASSWORD_HASHING_WORKERS = None
+
+PASSWORD_HASHING_QUEUE = 64
+
+PASSWORD_HASHING_QUEUE_TIMEOUT = 2.0
+
+# Current PBKDF2 parameters; hashes stored with older ones are upgraded on the next successful login.
+
+PASSWORD_HASHING_ALGORITHM = 'sha256'
+
+PASSWORD_HASHING_ITERATIONS = 200000
+
+# Seconds between in-process runs of the expired session / acknowledged update collector
+# (None: only run it through `manage.py collect_garbage`), and the time budget of each run.
+
+SESSION_GC_INTERVAL = None
+
+SESSION_GC_TIME_BUDGET = 5.0
+
+# Sodia button: seconds without a heartbeat before a press expires, and seconds between writes of
+# User.is_pressing_sodia_button.
+
+SODIA_BUTTON_TIMEOUT = 10.0
+
+SODIA_BUTTON_FLUSH_INTERVAL = 5.0
+
+# CACHES alias through which workers share who is pressing, every SODIA_BUTTON_FLUSH_INTERVAL seconds
+# (None: counts and partner states only cover presses handled by the same worker).
+
+SODIA_BUTTON_CACHE = 'shared'
+
+# Email (notification digests). Swap in the SMTP backend in production; the file backend
+# ('django.core.mail.backends.filebased.EmailBackend' + EMAIL_FILE_PATH) also works locally.
+# https://docs.djangoproject.com/en/6.0/topics/email/
+
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+DEFAULT_FROM_EMAIL = 'Sodia <no-reply@sodia.local>'
+
+# Per-request instrumentation: Server-Timing headers, a JSON log line per request on the
+# 'sodia.requests' logger and latency percentiles per URL name at /metrics.
+
+INSTRUMENTATION_ENABLED = False
+
+# Login throttling: token buckets of (attempts, per seconds) per client IP and per email, kept in
+# this CACHES alias (shared, or every worker gets its own buckets), and the number of password
+# checks a worker runs at once (None: one per CPU).
+
+LOGIN_THROTTLE_CACHE = 'shared'
+
+LOGIN_THROTTLE_IP = (20, 60)
+
+LOGIN_THROTTLE_EMAIL = (5, 60)
+
+LOGIN_MAX_CONCURRENT_HASHES = None
+
+# Friendships: privacy checks ask users.friends' per-process adjacency cache (this many users,
+# each entry trusted for this many seconds by processes other than the one that changed it).
+
+PRIVACY_FRIEND_IDS = 'users.friends.friend_ids'
+
+FRIEND_GRAPH_SIZE = 10000
+
+FRIEND_GRAPH_TTL = 30
+
+# CACHES alias for packed privacy masks; must be shared, or other workers keep showing hidden fields.
+
+PRIVACY_CACHE = 'shared'
+
+# Reference data (countries, houses, year groups, timetable): version counter alias, how often a worker
+# checks it, and the age (seconds) after which a worker reloads its copy regardless.
+
+REFERENCE_DATA_CACHE = 'shared'
+
+REFERENCE_DATA_CHECK_INTERVAL = 5.0
+
+REFERENCE_DATA_MAX_AGE = 300.0
+
+# CACHES alias for the per-user page versions behind cache_page_by_auth and {% cache %} fragments;
+# shared, so a settings change retires the user's cached pages in every worker.
+
+PAGE_VERSION_CACHE = 'shared'
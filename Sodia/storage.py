@@ -0,0 +1,89 @@
+"""
+Static files: content-hashed names with precompressed variants, and a view that serves them.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` writes ``main.3f2a9c.css`` next to
+``main.3f2a9c.css.gz`` (and ``.br`` when the optional ``brotli`` package is installed).
+``serve_static`` then picks the best variant the client accepts, never compresses per request, and
+marks hashed names as cacheable forever.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".mjs", ".svg", ".html", ".txt", ".json", ".xml", ".map")
+    MIN_SIZE = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = []
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.append(hashed_name)
+            yield name, hashed_name, processed
+        if not dry_run:
+            for hashed_name in hashed_names:
+                if hashed_name.endswith(self.COMPRESSIBLE_EXTENSIONS):
+                    self.compress(hashed_name)
+
+    def compress(self, name):
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < self.MIN_SIZE:
+            return
+        variants = [(".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(content)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(content):
+                with open(self.path(name + suffix), "wb") as f:
+                    f.write(compressed)
+
+
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+
+
+@require_safe
+def serve_static(request, path):
+    """Serves ``STATIC_ROOT`` with precompressed variants, far-future caching for hashed names and ETags."""
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    accepted = request.headers.get("Accept-Encoding", "")
+    encoding = None
+    for candidate, suffix in ENCODINGS:
+        if candidate in accepted and os.path.isfile(full_path + suffix):
+            encoding, full_path = candidate, full_path + suffix
+            break
+
+    stat = os.stat(full_path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    is_hashed = path in getattr(staticfiles_storage, "hashed_files", {}).values()
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        content_type, _ = mimetypes.guess_type(path)
+        response = FileResponse(open(full_path, "rb"), content_type=content_type or "application/octet-stream")
+        if encoding:
+            response["Content-Encoding"] = encoding
+    response["ETag"] = etag
+    response["Cache-Control"] = IMMUTABLE if is_hashed else REVALIDATE
+    response["Vary"] = "Accept-Encoding"
+    return response
@@ -0,0 +1,48 @@
+import logging
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Runs ``function`` every ``interval`` seconds on a daemon thread, started on first use."""
+
+    def __init__(self, interval, function, name=None):
+        self.interval = interval
+        self.function = function
+        self.name = name or getattr(function, "__qualname__", "periodic-task")
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        with self._lock:
+            if self.is_running:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.function()
+            except Exception:
+                logger.exception("Periodic task %s failed", self.name)
+            finally:
+                # connections are thread-local, so this only closes the ones this thread opened
+                connections.close_all()
@@ -0,0 +1,44 @@
+"""
+Test and benchmark isolation from the caches and static files a running server uses.
+
+``CACHES`` points ``shared`` at a file, database table or Redis that a dev server on the same
+machine is using too, so tests and ``manage.py benchmark`` would bump its page and reference
+versions and fill in privacy masks and login throttles for ids that only exist in the test
+database. ``local_caches()`` replaces every alias with its own in-process cache instead; it has to
+be in place before any service holding a cache (``get_privacy_resolver()`` and co.) is built.
+
+Tests also serve static files under their plain names, so pages render without ``collectstatic``
+having run; everywhere else a missing manifest entry is an error, as ``manifest_strict`` intends.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def local_caches() -> dict:
+    return {alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"local-{alias}"}
+            for alias in settings.CACHES}
+
+
+def isolated_caches():
+    return override_settings(CACHES=local_caches())
+
+
+def plain_static_files():
+    return override_settings(STORAGES={
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    })
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._overrides = [isolated_caches(), plain_static_files()]
+        for override in self._overrides:
+            override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        for override in reversed(self._overrides):
+            override.disable()
+        super().teardown_test_environment(**kwargs)
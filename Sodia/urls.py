@@ -15,9 +15,17 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 # from django.contrib import admin
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, re_path, include
+
+from .instrumentation import metrics_view
+from .storage import serve_static
 
 urlpatterns = [
     #    path('admin/', admin.site.urls),
     path('', include('users.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
+
+if not settings.DEBUG:
+    urlpatterns.append(re_path(rf'^{settings.STATIC_URL.lstrip("/")}(?P<path>.+)$', serve_static))
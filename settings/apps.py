@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class SettingsConfig(AppConfig):
     name = 'settings'
+
+    def ready(self):
+        from django.db.models.signals import post_save, post_delete
+        from .models import UserPrivacySettings, Country, House, YearGroup, TimetablePeriod
+        from .privacy import privacy_settings_saved
+        from .reference import reference_row_changed
+
+        post_save.connect(privacy_settings_saved, sender=UserPrivacySettings)
+        post_delete.connect(privacy_settings_saved, sender=UserPrivacySettings)
+        for model in (Country, House, YearGroup, TimetablePeriod):
+            post_save.connect(reference_row_changed, sender=model)
+            post_delete.connect(reference_row_changed, sender=model)
@@ -0,0 +1,60 @@
+"""
+Free periods as a fixed-width bitset.
+
+``UserAccountSettings.free_periods`` has ``TimetablePeriod.bit`` set for every period the user is
+free in (bit ``weekday * PERIODS_PER_DAY + number``), so "who shares a free period with me" or "who
+is free right now" is a single ``free_periods & mask != 0`` test per row in SQL rather than decoding
+every user's schedule in Python. The timetable itself comes from ``settings.reference``.
+"""
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TimetablePeriod
+from .privacy import visible_q
+from .reference import get_reference_data
+
+
+def period_bit(weekday, number) -> int:
+    if not 0 <= number < TimetablePeriod.PERIODS_PER_DAY:
+        raise ValueError(f"period number must be below {TimetablePeriod.PERIODS_PER_DAY}")
+    return 1 << (weekday * TimetablePeriod.PERIODS_PER_DAY + number)
+
+
+def pack(periods) -> int:
+    """``periods`` is an iterable of ``TimetablePeriod`` objects or ``(weekday, number)`` pairs."""
+    bits = 0
+    for period in periods:
+        bits |= period.bit if isinstance(period, TimetablePeriod) else period_bit(*period)
+    return bits
+
+
+def unpack(bits) -> list[TimetablePeriod]:
+    """The timetable's periods in ``bits``, in week order; bits without a period are ignored."""
+    return [period for period in sorted(get_reference_data().timetable, key=lambda period: period.bit)
+            if bits & period.bit]
+
+
+def current_mask(now=None) -> int:
+    """Bits of the periods in progress at ``now`` (usually one, 0 outside lessons)."""
+    now = timezone.localtime(now)
+    time = now.time()
+    return pack(period for period in get_reference_data().timetable
+                if period.weekday == now.weekday() and period.starts_at <= time < period.ends_at)
+
+
+def free_during(queryset, mask, viewer_id=None, friends=None):
+    """
+    Narrows a ``User`` queryset to users free in at least one period of ``mask`` who let
+    ``viewer_id`` see their free periods (``friends`` as for ``privacy.with_visible_fields``), and
+    annotates ``shared_free_periods`` with the overlapping bits; ``.bit_count()`` ranks them.
+    """
+    if not mask:
+        return queryset.none()
+    return (queryset.filter(visible_q("free_periods", viewer_id, friends),
+                            account_settings__free_periods__has_any=mask)
+            .exclude(pk=viewer_id)
+            .annotate(shared_free_periods=F("account_settings__free_periods").bitand(mask)))
+
+
+def free_now(queryset, viewer_id=None, friends=None, now=None):
+    return free_during(queryset, current_mask(now), viewer_id, friends)
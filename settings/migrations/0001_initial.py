@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:50
+
+import Sodia.models
+import django.db.models.deletion
+import settings.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Country',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('code', models.CharField(max_length=2, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='House',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20)),
+                ('boarding_type', Sodia.models.IntFlagField(choices=[(1, 'boarding'), (2, 'day'), (4, 'mixed')], enum_class=settings.models.HouseBoardingType)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserChallengesSettings',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='challenges_settings', serialize=False, to='users.user')),
+                ('frequency', Sodia.models.IntFlagField(choices=[(1, 'immediate'), (2, 'day'), (4, 'three_days'), (8, 'week'), (16, 'never')], default=settings.models.FrequencySetting['THREE_DAYS'], enum_class=settings.models.FrequencySetting)),
+                ('gender_filter', Sodia.models.IntFlagField(default=settings.models.GenderFilter['MALE'] | settings.models.GenderFilter['FEMALE'] | settings.models.GenderFilter['OTHER'], enum_class=settings.models.GenderFilter)),
+                ('subjects_match', models.FloatField(default=0.0)),
+                ('interests_match', models.FloatField(default=0.0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserNotificationSettings',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_settings', serialize=False, to='users.user')),
+                ('unread_messages', models.BooleanField(default=True)),
+                ('challenges_updates', models.BooleanField(default=True)),
+                ('new_friend_requests', models.BooleanField(default=True)),
+                ('accepted_friend_requests', models.BooleanField(default=True)),
+                ('sodia_button_updates', models.BooleanField(default=True)),
+                ('digest_frequency', Sodia.models.IntFlagField(choices=[(1, 'immediate'), (2, 'day'), (4, 'three_days'), (8, 'week'), (16, 'never')], default=settings.models.FrequencySetting['DAY'], enum_class=settings.models.FrequencySetting)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserPrivacySettings',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='privacy_settings', serialize=False, to='users.user')),
+                ('full_name', Sodia.models.IntFlagField(choices=[(1, 'everyone'), (2, 'friends_only'), (4, 'nobody')], default=settings.models.PrivacySetting['EVERYONE'], enum_class=settings.models.PrivacySetting)),
+                ('profile_picture', Sodia.models.IntFlagField(choices=[(1, 'everyone'), (2, 'friends_only'), (4, 'nobody')], default=settings.models.PrivacySetting['EVERYONE'], enum_class=settings.models.PrivacySetting)),
+                ('birthday', Sodia.models.IntFlagField(choices=[(1, 'everyone'), (2, 'friends_only'), (4, 'nobody')], default=settings.models.PrivacySetting['EVERYONE'], enum_class=settings.models.PrivacySetting)),
+                ('free_periods', Sodia.models.IntFlagField(choices=[(1, 'everyone'), (2, 'friends_only'), (4, 'nobody')], default=settings.models.PrivacySetting['FRIENDS_ONLY'], enum_class=settings.models.PrivacySetting)),
+                ('interests', Sodia.models.IntFlagField(choices=[(1, 'everyone'), (2, 'friends_only'), (4, 'nobody')], default=settings.models.PrivacySetting['EVERYONE'], enum_class=settings.models.PrivacySetting)),
+                ('description', Sodia.models.IntFlagField(choices=[(1, 'everyone'), (2, 'friends_only'), (4, 'nobody')], default=settings.models.PrivacySetting['EVERYONE'], enum_class=settings.models.PrivacySetting)),
+                ('friends', Sodia.models.IntFlagField(choices=[(1, 'everyone'), (2, 'friends_only'), (4, 'nobody')], default=settings.models.PrivacySetting['FRIENDS_ONLY'], enum_class=settings.models.PrivacySetting)),
+                ('message', Sodia.models.IntFlagField(choices=[(1, 'everyone'), (2, 'friends_only'), (4, 'nobody')], default=settings.models.PrivacySetting['FRIENDS_ONLY'], enum_class=settings.models.PrivacySetting)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='YearGroup',
+            fields=[
+                ('year_group_number', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserAccountSettings',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='account_settings', serialize=False, to='users.user')),
+                ('username', models.CharField(max_length=30, unique=True)),
+                ('first_name', models.CharField(max_length=50)),
+                ('last_name', models.CharField(max_length=50)),
+                ('display_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('is_full_name_hidden', models.BooleanField(default=False)),
+                ('gender', models.CharField(blank=True, max_length=30, null=True)),
+                ('birth_date', models.DateField(blank=True, null=True)),
+                ('description', models.TextField(blank=True, max_length=2000, null=True)),
+                ('boarding_type', Sodia.models.IntFlagField(blank=True, choices=[(1, 'full'), (2, 'weekly'), (4, 'day')], enum_class=settings.models.PupilBoardingType, null=True)),
+                ('country', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='settings.country')),
+                ('house', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='settings.house')),
+                ('year_group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='settings.yeargroup')),
+            ],
+        ),
+    ]
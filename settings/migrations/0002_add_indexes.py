@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings', '0001_initial'),
+        ('users', '0002_add_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userchallengessettings',
+            index=models.Index(fields=['frequency', 'gender_filter'], name='settings_us_frequen_abd820_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:56
+
+import Sodia.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings', '0002_add_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccountsettings',
+            name='free_periods',
+            field=Sodia.models.BitSetField(default=0),
+        ),
+        migrations.CreateModel(
+            name='TimetablePeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.IntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('number', models.IntegerField()),
+                ('name', models.CharField(max_length=20)),
+                ('starts_at', models.TimeField()),
+                ('ends_at', models.TimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('weekday', 'number'), name='unique_timetable_period'), models.CheckConstraint(condition=models.Q(('number__gte', 0), ('number__lt', 9)), name='timetable_period_number')],
+            },
+        ),
+    ]
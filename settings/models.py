@@ -2,7 +2,7 @@ from enum import IntFlag, auto
 
 from django.db import models
 
-from Sodia.models import IntFlagField
+from Sodia.models import IntFlagField, BitSetField
 
 
 # Create your models here.
@@ -33,6 +33,37 @@ class YearGroup(models.Model):
     name = models.CharField(max_length=20)
 
 
+class Weekday(models.IntegerChoices):
+    MONDAY = 0
+    TUESDAY = 1
+    WEDNESDAY = 2
+    THURSDAY = 3
+    FRIDAY = 4
+    SATURDAY = 5
+    SUNDAY = 6
+
+
+class TimetablePeriod(models.Model):
+    """One period of the school's weekly timetable; its ``bit`` is its slot in every ``free_periods`` bitset."""
+    PERIODS_PER_DAY = 9  # 7 days * 9 periods = 63 bits, the width of a BitSetField
+
+    weekday = models.IntegerField(choices=Weekday)
+    number = models.IntegerField()  # 0-based position within the day
+    name = models.CharField(max_length=20)
+    starts_at = models.TimeField()
+    ends_at = models.TimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["weekday", "number"], name="unique_timetable_period"),
+            models.CheckConstraint(condition=models.Q(number__gte=0, number__lt=9), name="timetable_period_number"),
+        ]
+
+    @property
+    def bit(self):
+        return 1 << (self.weekday * self.PERIODS_PER_DAY + self.number)
+
+
 class UserAccountSettings(models.Model):
     user = models.OneToOneField("users.User", on_delete=models.CASCADE, related_name='account_settings',
                                 primary_key=True)
@@ -49,7 +80,7 @@ class UserAccountSettings(models.Model):
     house = models.ForeignKey(House, null=True, blank=True, on_delete=models.SET_NULL)
     boarding_type = IntFlagField(PupilBoardingType, null=True, blank=True, exclusive_choices=True)
     year_group = models.ForeignKey(YearGroup, null=True, blank=True, on_delete=models.SET_NULL)
-    # free_periods = ??? TODO: JSONField
+    free_periods = BitSetField()  # TimetablePeriod.bit of every period the user is free in, see settings.free_periods
 
 
 class PrivacySetting(IntFlag):
@@ -71,6 +102,14 @@ class UserPrivacySettings(models.Model):
     message = IntFlagField(enum_class=PrivacySetting, exclusive_choices=True, default=PrivacySetting.FRIENDS_ONLY)
 
 
+class FrequencySetting(IntFlag):
+    IMMEDIATE = auto()
+    DAY = auto()
+    THREE_DAYS = auto()
+    WEEK = auto()
+    NEVER = auto()
+
+
 class UserNotificationSettings(models.Model):
     user = models.OneToOneField("users.User", on_delete=models.CASCADE, related_name="notification_settings",
                                 primary_key=True)
@@ -79,14 +118,7 @@ class UserNotificationSettings(models.Model):
     new_friend_requests = models.BooleanField(default=True)
     accepted_friend_requests = models.BooleanField(default=True)
     sodia_button_updates = models.BooleanField(default=True)
-
-
-class FrequencySetting(IntFlag):
-    IMMEDIATE = auto()
-    DAY = auto()
-    THREE_DAYS = auto()
-    WEEK = auto()
-    NEVER = auto()
+    digest_frequency = IntFlagField(enum_class=FrequencySetting, exclusive_choices=True, default=FrequencySetting.DAY)
 
 
 class GenderFilter(IntFlag):
@@ -104,3 +136,9 @@ class UserChallengesSettings(models.Model):
     gender_filter = IntFlagField(enum_class=GenderFilter, default=GenderFilter.ALL)
     subjects_match = models.FloatField(default=0.0)  # TODO: set default
     interests_match = models.FloatField(default=0.0)  # TODO: set default
+
+    class Meta:
+        indexes = [
+            # matching buckets by frequency, then filters by gender
+            models.Index(fields=["frequency", "gender_filter"]),
+        ]
@@ -0,0 +1,136 @@
+"""
+Batched "which profile fields may this viewer see" resolution.
+
+A user's ``UserPrivacySettings`` row is packed into one int: the low byte has a bit per field that
+is visible to everyone, the high byte a bit per field visible to friends. Packed masks are kept in
+the ``PRIVACY_CACHE`` alias, which every worker shares (invalidated when the row is saved), so
+resolving a page of N profiles is a ``get_many``, at most one query for cache misses and at most
+one friendship query.
+"""
+from functools import cache
+
+from django.conf import settings
+from django.core.cache import cache as default_cache, caches
+from django.db import transaction
+from django.db.models import Case, When, Value, BooleanField, Q
+from django.utils.module_loading import import_string
+
+from .models import UserPrivacySettings, PrivacySetting
+
+PRIVACY_FIELDS = tuple(f.name for f in UserPrivacySettings._meta.get_fields() if f.name != "user")
+FIELD_BITS = {name: 1 << i for i, name in enumerate(PRIVACY_FIELDS)}
+ALL_FIELDS = (1 << len(PRIVACY_FIELDS)) - 1
+# bitset -> field names, so decoding a mask is a tuple index
+FIELD_SETS = tuple(frozenset(name for name, bit in FIELD_BITS.items() if bits & bit) for bits in range(ALL_FIELDS + 1))
+
+
+def pack(settings_values: dict) -> int:
+    public = friends = 0
+    for name, bit in FIELD_BITS.items():
+        setting = settings_values[name]
+        if setting == PrivacySetting.EVERYONE:
+            public |= bit
+            friends |= bit
+        elif setting == PrivacySetting.FRIENDS_ONLY:
+            friends |= bit
+    return public | friends << 8
+
+
+DEFAULT_MASK = pack({name: UserPrivacySettings._meta.get_field(name).default for name in PRIVACY_FIELDS})
+
+
+def no_friends(viewer_id, user_ids):
+    return set()
+
+
+class PrivacyResolver:
+    KEY_PREFIX = "privacy:"
+    TIMEOUT = 60 * 60
+
+    def __init__(self, cache=default_cache, friend_ids=no_friends):
+        self.cache = cache
+        # (viewer_id, candidate user ids) -> subset of candidates that are the viewer's friends
+        self.friend_ids = friend_ids
+
+    @classmethod
+    def from_settings(cls):
+        path = getattr(settings, "PRIVACY_FRIEND_IDS", None)
+        return cls(cache=caches[getattr(settings, "PRIVACY_CACHE", "default")],
+                   friend_ids=import_string(path) if path else no_friends)
+
+    def _key(self, user_id):
+        return f"{self.KEY_PREFIX}{user_id}"
+
+    def masks(self, user_ids) -> dict:
+        user_ids = list(user_ids)
+        cached = self.cache.get_many([self._key(user_id) for user_id in user_ids])
+        masks = {user_id: cached[self._key(user_id)] for user_id in user_ids if self._key(user_id) in cached}
+        missing = [user_id for user_id in user_ids if user_id not in masks]
+        if missing:
+            loaded = {row["user_id"]: pack(row) for row in
+                      UserPrivacySettings.objects.filter(user_id__in=missing).values("user_id", *PRIVACY_FIELDS)}
+            loaded.update((user_id, DEFAULT_MASK) for user_id in missing if user_id not in loaded)
+            self.cache.set_many({self._key(user_id): mask for user_id, mask in loaded.items()}, self.TIMEOUT)
+            masks.update(loaded)
+        return masks
+
+    def invalidate(self, user_id):
+        self.cache.delete(self._key(user_id))
+
+    def visible_fields(self, viewer_id, user_ids) -> dict:
+        """user_id -> frozenset of field names ``viewer_id`` (None for anonymous) may see."""
+        masks = self.masks(user_ids)
+        # only ask about friendship where it would actually reveal more
+        needs_friendship = [user_id for user_id, mask in masks.items()
+                            if viewer_id is not None and user_id != viewer_id and mask >> 8 != mask & 0xFF]
+        friends = self.friend_ids(viewer_id, needs_friendship) if needs_friendship else set()
+        visible = {}
+        for user_id, mask in masks.items():
+            if user_id == viewer_id:
+                bits = ALL_FIELDS
+            elif user_id in friends:
+                bits = mask >> 8
+            else:
+                bits = mask & 0xFF
+            visible[user_id] = FIELD_SETS[bits]
+        return visible
+
+    def can_see(self, viewer_id, user_id, field_name) -> bool:
+        return field_name in self.visible_fields(viewer_id, [user_id])[user_id]
+
+
+@cache
+def get_privacy_resolver() -> PrivacyResolver:
+    return PrivacyResolver.from_settings()
+
+
+def privacy_settings_saved(sender, instance, **kwargs):
+    resolver, user_id = get_privacy_resolver(), instance.user_id
+    resolver.invalidate(user_id)
+    # again once committed, in case another worker re-cached the old row in between
+    transaction.on_commit(lambda: resolver.invalidate(user_id))
+
+
+def with_visible_fields(queryset, viewer_id, friends=None, prefix="privacy_settings__"):
+    """
+    Annotates a ``User`` queryset with ``can_see_<field>`` booleans computed in SQL. ``friends`` is
+    an optional collection or subquery of the viewer's friend ids (e.g. ``users.friends``'s cached
+    set); without it FRIENDS_ONLY means hidden.
+    """
+    annotations = {f"can_see_{name}": Case(When(visible_q(name, viewer_id, friends, prefix), then=Value(True)),
+                                           default=Value(False), output_field=BooleanField())
+                   for name in PRIVACY_FIELDS}
+    return queryset.annotate(**annotations)
+
+
+def visible_q(name, viewer_id, friends=None, prefix="privacy_settings__", user_field="pk"):
+    """
+    The ``Q`` behind ``can_see_<name>``, for filtering on a single field. ``prefix`` and
+    ``user_field`` locate the privacy row and the user id when the queryset is not over ``User``.
+    """
+    visible = Q(**{prefix + name: PrivacySetting.EVERYONE})
+    if viewer_id is not None:
+        visible |= Q(**{user_field: viewer_id})
+        if friends is not None:
+            visible |= Q(**{prefix + name: PrivacySetting.FRIENDS_ONLY}) & Q(**{user_field + "__in": friends})
+    return visible
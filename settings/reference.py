@@ -0,0 +1,116 @@
+"""
+Process-wide cache of the small lookup tables (``Country``, ``House``, ``YearGroup``, ``TimetablePeriod``).
+
+Tables are loaded on first use. Any change to a row bumps a version counter in the
+``REFERENCE_DATA_CACHE`` alias (shared by every worker); each worker compares its loaded version
+with it at most once per ``CHECK_INTERVAL`` seconds and reloads when it moved, and reloads anyway
+after ``MAX_AGE`` seconds in case a bump was lost. Profile and matching code can skip these joins.
+"""
+import threading
+import time
+from functools import cache
+
+from django.conf import settings
+from django.core.cache import cache as default_cache, caches
+from django.db import transaction
+
+from .models import Country, House, YearGroup, TimetablePeriod
+
+
+class ReferenceTable:
+    def __init__(self, objects, code_field=None, label_field="name", order_by="name"):
+        self.by_id = {obj.pk: obj for obj in objects}
+        self.by_code = {getattr(obj, code_field): obj for obj in objects} if code_field else {}
+        self.choices = [(obj.pk, getattr(obj, label_field))
+                        for obj in sorted(objects, key=lambda obj: getattr(obj, order_by))]
+
+    def get(self, pk):
+        return None if pk is None else self.by_id.get(pk)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __len__(self):
+        return len(self.by_id)
+
+
+class ReferenceData:
+    VERSION_KEY = "reference-data:version"
+    CHECK_INTERVAL = 5.0
+    MAX_AGE = 300.0
+
+    def __init__(self, cache=default_cache, check_interval=CHECK_INTERVAL, max_age=MAX_AGE):
+        self.cache = cache
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._tables = None
+        self._version = None
+        self._next_check = 0.0
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            cache=caches[getattr(settings, "REFERENCE_DATA_CACHE", "default")],
+            check_interval=getattr(settings, "REFERENCE_DATA_CHECK_INTERVAL", cls.CHECK_INTERVAL),
+            max_age=getattr(settings, "REFERENCE_DATA_MAX_AGE", cls.MAX_AGE),
+        )
+
+    def _current_version(self):
+        return self.cache.get_or_set(self.VERSION_KEY, 0, None)
+
+    def _load(self):
+        now = time.monotonic()
+        if self._tables is not None and now < self._next_check:
+            return self._tables
+        with self._lock:
+            version = self._current_version()
+            if self._tables is None or version != self._version or now >= self._expires:
+                self._tables = {
+                    "countries": ReferenceTable(list(Country.objects.all()), code_field="code"),
+                    "houses": ReferenceTable(list(House.objects.all()), code_field="name"),
+                    "year_groups": ReferenceTable(list(YearGroup.objects.all()), code_field="year_group_number",
+                                                  order_by="year_group_number"),
+                    "timetable": ReferenceTable(list(TimetablePeriod.objects.all()), code_field="bit",
+                                                order_by="bit"),
+                }
+                self._version = version
+                self._expires = now + self.max_age
+            self._next_check = now + self.check_interval
+            return self._tables
+
+    @property
+    def countries(self) -> ReferenceTable:
+        return self._load()["countries"]
+
+    @property
+    def houses(self) -> ReferenceTable:
+        return self._load()["houses"]
+
+    @property
+    def year_groups(self) -> ReferenceTable:
+        return self._load()["year_groups"]
+
+    @property
+    def timetable(self) -> ReferenceTable:
+        return self._load()["timetable"]
+
+    def invalidate(self):
+        """Marks every worker's copy stale, this one immediately."""
+        try:
+            self.cache.incr(self.VERSION_KEY)
+        except ValueError:
+            self.cache.set(self.VERSION_KEY, 1, None)
+        self._tables = None
+
+
+@cache
+def get_reference_data() -> ReferenceData:
+    return ReferenceData.from_settings()
+
+
+def reference_row_changed(sender, **kwargs):
+    get_reference_data().invalidate()
+    # again once committed, so no worker keeps a copy it reloaded before the change was visible
+    transaction.on_commit(get_reference_data().invalidate)
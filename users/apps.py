@@ -3,3 +3,26 @@ from django.apps import AppConfig
 
 class LoginConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        from django.db.models.signals import post_save, post_delete
+        from settings.models import (UserAccountSettings, UserPrivacySettings, UserNotificationSettings,
+                                     UserChallengesSettings)
+        from .friends import friendship_changed
+        from .matching import challenges_settings_saved
+        from .models import Friendship, Session, User
+        from .page_cache import user_row_saved
+        from .search import account_settings_saved
+        from .sessions import session_saved, session_deleted, user_saved
+
+        post_save.connect(session_saved, sender=Session)
+        post_delete.connect(session_deleted, sender=Session)
+        post_save.connect(user_saved, sender=User)
+        post_delete.connect(user_saved, sender=User)
+        post_save.connect(friendship_changed, sender=Friendship)
+        post_delete.connect(friendship_changed, sender=Friendship)
+        post_save.connect(account_settings_saved, sender=UserAccountSettings)
+        post_save.connect(challenges_settings_saved, sender=UserChallengesSettings)
+        for model in (User, UserAccountSettings, UserPrivacySettings, UserNotificationSettings,
+                      UserChallengesSettings):
+            post_save.connect(user_row_saved, sender=model)
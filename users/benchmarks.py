@@ -0,0 +1,207 @@
+"""
+Reproducible benchmarks for the auth and profile hot paths; run with ``manage.py benchmark``.
+
+Everything runs against a throwaway test database seeded with a synthetic school and against
+in-process caches, so results depend only on the code and the machine. Each scenario reports
+operations per second, queries per operation and latency percentiles.
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import RequestFactory, AsyncClient
+
+from Sodia.instrumentation import LatencyHistogram
+from settings.models import (Country, House, HouseBoardingType, YearGroup, UserAccountSettings, UserChallengesSettings,
+                             FrequencySetting, GenderFilter)
+from .matching import rematch_all
+from .middleware import AuthenticationMiddleware
+from .models import User, Session, UserLoginDetails
+from .profiles import ProfileBundle
+from .sessions import get_session_cache
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    operations: int
+    seconds: float
+    ops_per_second: float
+    queries_per_operation: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+class QueryCounter:
+    """
+    Counts queries on every connection of every thread, including the ones async ORM calls make
+    on ``sync_to_async``'s executor thread, which ``CaptureQueriesContext`` would miss.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self, connection):
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+
+@contextmanager
+def count_queries():
+    """
+    Yields a ``QueryCounter`` wrapped around this thread's connections and every connection opened
+    meanwhile; connections another thread opened earlier are not seen, so open them inside.
+    """
+    counter = QueryCounter()
+    installed = list(connections.all(initialized_only=True))
+    for connection in installed:
+        counter.install(connection)
+
+    def created(sender, connection, **kwargs):
+        counter.install(connection)
+        installed.append(connection)
+
+    connection_created.connect(created, weak=False)
+    try:
+        yield counter
+    finally:
+        connection_created.disconnect(created)
+        for connection in installed:
+            counter.uninstall(connection)
+
+
+def measure(name, operation, repeat) -> ScenarioResult:
+    latencies = LatencyHistogram(size=repeat)
+    with count_queries() as queries:
+        started = time.perf_counter()
+        for i in range(repeat):
+            op_started = time.perf_counter()
+            operation(i)
+            latencies.add(name, time.perf_counter() - op_started)
+        seconds = time.perf_counter() - started
+    return result(name, repeat, seconds, queries.count, latencies)
+
+
+def result(name, operations, seconds, query_count, latencies) -> ScenarioResult | None:
+    """None when nothing ran (``--logins 0`` and the like); such scenarios are left out of the report."""
+    if not operations:
+        return None
+    percentiles = latencies.percentiles(name)
+    return ScenarioResult(
+        name=name, operations=operations, seconds=round(seconds, 4),
+        ops_per_second=round(operations / seconds, 1) if seconds else 0.0,
+        queries_per_operation=round(query_count / operations, 2) if operations else 0.0,
+        **{f"{key}_ms": round(value * 1000, 3) for key, value in percentiles.items()})
+
+
+def seed(users, sessions_per_user, rng):
+    """A synthetic school: reference data, ``users`` accounts with every settings row and their sessions."""
+    year_groups = [YearGroup.objects.create(year_group_number=number, name=f"Year {number}") for number in range(7, 14)]
+    houses = [House.objects.create(name=f"House {i}", boarding_type=rng.choice(list(HouseBoardingType)))
+              for i in range(8)]
+    countries = [Country.objects.create(name=f"Country {i}", code=f"C{i}") for i in range(10)]
+    created = User.objects.create_users(
+        {"first_name": f"First{i}", "last_name": f"Last{i}", "email": f"pupil{i}@school.example",
+         "password": f"password-{i}"} for i in range(users)).created
+
+    accounts = list(UserAccountSettings.objects.all())
+    for account in accounts:
+        account.year_group = rng.choice(year_groups)
+        account.house = rng.choice(houses)
+        account.country = rng.choice(countries)
+        account.gender = rng.choice(["male", "female", "other"])
+    UserAccountSettings.objects.bulk_update(accounts, ["year_group", "house", "country", "gender"], batch_size=500)
+    challenges = list(UserChallengesSettings.objects.all())
+    for settings in challenges:
+        settings.frequency = rng.choice(list(FrequencySetting))
+        settings.gender_filter = rng.choice([GenderFilter.ALL, GenderFilter.MALE, GenderFilter.FEMALE])
+        settings.subjects_match = rng.random()
+        settings.interests_match = rng.random()
+    UserChallengesSettings.objects.bulk_update(
+        challenges, ["frequency", "gender_filter", "subjects_match", "interests_match"], batch_size=500)
+    sessions = Session.objects.bulk_create(
+        Session(user=user, last_request_ip="127.0.0.1") for user in created for _ in range(sessions_per_user))
+    return created, sessions
+
+
+def run(users=500, sessions_per_user=2, requests=2000, logins=20, concurrency=50, seed_value=0) -> dict:
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+    created, sessions = seed(users, sessions_per_user, rng)
+    seed_seconds = time.perf_counter() - started
+    tokens = [session.token for session in sessions]
+    user_ids = [user.pk for user in created]
+    factory = RequestFactory()
+    middleware = AuthenticationMiddleware(lambda request: HttpResponse())
+
+    def authenticated_request(i):
+        request = factory.get("/", HTTP_X_FORWARDED_FOR="127.0.0.1")
+        request.COOKIES["auth"] = tokens[i % len(tokens)]
+        middleware(request)
+
+    results = []
+    get_session_cache().clear()
+    results.append(measure("middleware_cold_cache", authenticated_request, min(requests, len(tokens))))
+    results.append(measure("middleware_warm_cache", authenticated_request, requests))
+
+    login_details = list(UserLoginDetails.objects.filter(user_id__in=user_ids[:logins]))
+    passwords = {details.user_id: f"password-{user_ids.index(details.user_id)}" for details in login_details}
+    results.append(measure("login_check_password",
+                           lambda i: login_details[i].check_password(passwords[login_details[i].user_id]),
+                           len(login_details)))
+
+    pages = [user_ids[i:i + 20] for i in range(0, len(user_ids), 20)]
+    for use_case in ("card", "profile", "settings"):
+        results.append(measure(f"profile_page_{use_case}",
+                               lambda i, use_case=use_case: ProfileBundle.load_many(pages[i % len(pages)], use_case),
+                               len(pages)))
+
+    results.append(measure("matching_rematch_all", lambda i: rematch_all(), 1))
+    results.append(asgi_requests(tokens, requests, concurrency))
+    return {
+        "parameters": {"users": users, "sessions_per_user": sessions_per_user, "requests": requests,
+                       "logins": logins, "concurrency": concurrency, "seed": seed_value},
+        "seed_seconds": round(seed_seconds, 3),
+        "scenarios": [asdict(scenario) for scenario in results if scenario is not None],
+    }
+
+
+def asgi_requests(tokens, requests, concurrency) -> ScenarioResult:
+    """``requests`` GETs of the authenticated page through the full ASGI stack, ``concurrency`` at a time."""
+    name = "asgi_concurrent_requests"
+    latencies = LatencyHistogram(size=requests)
+
+    async def worker(worker_number):
+        client = AsyncClient()
+        for i in range(worker_number, requests, concurrency):
+            client.cookies["auth"] = tokens[i % len(tokens)]
+            op_started = time.perf_counter()
+            await client.get("/auth")
+            latencies.add(name, time.perf_counter() - op_started)
+
+    async def main():
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+
+    # asyncio.run() starts a fresh loop, so its executor thread connects inside count_queries()
+    with count_queries() as queries:
+        started = time.perf_counter()
+        asyncio.run(main())
+        seconds = time.perf_counter() - started
+    return result(name, requests, seconds, queries.count, latencies)
@@ -0,0 +1,8 @@
+from .page_cache import auth_cache_key
+
+
+def auth(request):
+    return {
+        "auth": getattr(request, "auth", None),
+        "auth_cache_key": auth_cache_key(request),
+    }
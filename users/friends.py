@@ -0,0 +1,117 @@
+"""
+Per-process friendship adjacency cache.
+
+Each worker keeps user_id -> frozenset of friend ids in an LRU, so "are A and B friends?" is a set
+membership test and mutual-friend counts for a page of users cost at most one query for the ids it
+has not seen yet. Saving or deleting a ``Friendship`` drops both ends from this process immediately;
+other processes pick the change up within ``local_ttl`` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import cache
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Friendship, User
+from .page_cache import bump_user_version
+
+
+class FriendGraph:
+    MAX_SIZE = 10000
+    LOCAL_TTL = 30
+
+    def __init__(self, max_size=MAX_SIZE, local_ttl=LOCAL_TTL):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self._entries: OrderedDict = OrderedDict()  # user_id -> (friend ids, deadline)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_size=getattr(settings, "FRIEND_GRAPH_SIZE", cls.MAX_SIZE),
+            local_ttl=getattr(settings, "FRIEND_GRAPH_TTL", cls.LOCAL_TTL),
+        )
+
+    def friends(self, user_id) -> frozenset:
+        user_id = User._meta.pk.to_python(user_id)
+        return self.friends_many([user_id])[user_id]
+
+    def friends_many(self, user_ids) -> dict:
+        """user_id -> frozenset of friend ids; ids not cached yet are loaded with one query."""
+        user_ids = {User._meta.pk.to_python(user_id) for user_id in user_ids}
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            generation = self._generation
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[0]
+        missing = user_ids - found.keys()
+        if missing:
+            loaded = {user_id: frozenset(friends) for user_id, friends in
+                      Friendship.objects.friend_id_map(missing).items()}
+            found.update(loaded)
+            with self._lock:
+                if generation == self._generation:  # nothing was invalidated while we were loading
+                    deadline = now + self.local_ttl
+                    for user_id, friends in loaded.items():
+                        self._entries[user_id] = (friends, deadline)
+                        self._entries.move_to_end(user_id)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+        return found
+
+    def are_friends(self, user_id, other_id) -> bool:
+        return User._meta.pk.to_python(other_id) in self.friends(user_id)
+
+    def friend_ids(self, viewer_id, user_ids) -> set:
+        """The ids in ``user_ids`` that are ``viewer_id``'s friends (the ``PrivacyResolver`` hook)."""
+        if viewer_id is None:
+            return set()
+        friends = self.friends(viewer_id)
+        return {user_id for user_id in user_ids if User._meta.pk.to_python(user_id) in friends}
+
+    def mutual_counts(self, user_id, other_ids) -> dict:
+        """other_id -> number of friends it shares with ``user_id``."""
+        friends = self.friends_many([user_id, *other_ids])
+        mine = friends[User._meta.pk.to_python(user_id)]
+        return {other_id: len(mine & friends[User._meta.pk.to_python(other_id)]) for other_id in other_ids}
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@cache
+def get_friend_graph() -> FriendGraph:
+    return FriendGraph.from_settings()
+
+
+def friend_ids(viewer_id, user_ids):
+    return get_friend_graph().friend_ids(viewer_id, user_ids)
+
+
+def friendship_changed(sender, instance, **kwargs):
+    user_ids = (instance.from_user_id, instance.to_user_id)
+    get_friend_graph().invalidate(*user_ids)
+    # again once committed, in case another thread re-read the old rows in between
+    transaction.on_commit(lambda: get_friend_graph().invalidate(*user_ids))
+    # what each of them may see of the other changed, so their cached pages are stale
+    bump_user_version(instance.from_user_id)
+    bump_user_version(instance.to_user_id)
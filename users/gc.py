@@ -0,0 +1,68 @@
+import time
+from dataclasses import dataclass
+from functools import cache
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from Sodia.tasks import PeriodicTask
+from .models import Session, SessionUpdate, NotificationEvent
+
+
+@dataclass
+class GarbageCollectionReport:
+    sessions: int = 0
+    updates: int = 0
+    notifications: int = 0
+    seconds: float = 0.0
+    complete: bool = True  # False if the time budget ran out before everything was reclaimed
+
+    def __str__(self):
+        return (f"Deleted {self.sessions} expired sessions, {self.updates} updates and {self.notifications} "
+                f"sent notifications in {self.seconds:.2f}s"
+                + ("" if self.complete else " (time budget exhausted)"))
+
+
+def collect_garbage(chunk_size=1000, time_budget=None) -> GarbageCollectionReport:
+    """
+    Deletes expired sessions (with their queued updates), acknowledged updates of live sessions and
+    notification events that already went out in a digest, ``chunk_size`` rows per statement so no
+    single transaction holds the write lock for long.
+    Stops between chunks once ``time_budget`` seconds have been spent.
+    """
+    report = GarbageCollectionReport()
+    started = time.perf_counter()
+    now = timezone.now()
+    expired_sessions = Session.objects.filter(expires_at__lte=now)
+    acknowledged_updates = SessionUpdate.objects.filter(update_number__lte=F("session__acknowledged_update_number"))
+    sent_notifications = NotificationEvent.objects.filter(id__lte=F("user__notification_digest__last_event_id"))
+
+    for queryset in (expired_sessions, acknowledged_updates, sent_notifications):
+        while True:
+            if time_budget is not None and time.perf_counter() - started >= time_budget:
+                report.complete = False
+                break
+            ids = list(queryset.values_list("pk", flat=True)[:chunk_size])
+            if not ids:
+                break
+            # expired sessions take their queued updates with them through the cascade
+            _, deleted = queryset.model.objects.filter(pk__in=ids).delete()
+            report.sessions += deleted.get(Session._meta.label, 0)
+            report.updates += deleted.get(SessionUpdate._meta.label, 0)
+            report.notifications += deleted.get(NotificationEvent._meta.label, 0)
+        if not report.complete:
+            break
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+@cache
+def get_periodic_gc():
+    """The in-process collector, or None unless ``SESSION_GC_INTERVAL`` is set."""
+    interval = getattr(settings, "SESSION_GC_INTERVAL", None)
+    if not interval:
+        return None
+    time_budget = getattr(settings, "SESSION_GC_TIME_BUDGET", None)
+    return PeriodicTask(interval, lambda: collect_garbage(time_budget=time_budget), name="session-gc")
@@ -0,0 +1,119 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import cache
+
+from django.conf import settings
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class HashingService:
+    """
+    Bounded worker pool for password hashing.
+
+    ``hashlib.pbkdf2_hmac`` releases the GIL, so plain threads hash in parallel without the
+    pickling and start-up cost of a process pool. At most ``max_workers + max_queue`` jobs are
+    admitted at once; anything beyond that waits up to ``queue_timeout`` seconds for a slot and
+    then fails with ``HashingBusy`` instead of piling up behind the rest of the burst.
+    """
+    MAX_QUEUE = 64
+    QUEUE_TIMEOUT = 2.0
+
+    def __init__(self, max_workers=None, max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="password-hashing")
+        # async callers block in acquire() on these threads, in line with sync callers
+        self._waiters = ThreadPoolExecutor(max(max_queue, 1), thread_name_prefix="password-hashing-wait")
+        self._slots = threading.BoundedSemaphore(self.max_workers + max_queue)
+        self._admitted = 0
+        self._admitted_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_workers=getattr(settings, "PASSWORD_HASHING_WORKERS", None),
+            max_queue=getattr(settings, "PASSWORD_HASHING_QUEUE", cls.MAX_QUEUE),
+            queue_timeout=getattr(settings, "PASSWORD_HASHING_QUEUE_TIMEOUT", cls.QUEUE_TIMEOUT),
+        )
+
+    @property
+    def queue_depth(self):
+        """Jobs admitted but not yet finished (running + waiting)."""
+        return self._admitted
+
+    def _submit(self, fn, *args) -> Future:
+        with self._admitted_lock:
+            self._admitted += 1
+        try:
+            # run in the caller's context, so per-request instrumentation sees the hashing time
+            future = self._executor.submit(contextvars.copy_context().run, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future=None):
+        with self._admitted_lock:
+            self._admitted -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args, timeout=None, blocking=False) -> Future:
+        """Waits up to ``timeout`` (default ``queue_timeout``) for a slot, or as long as it takes with ``blocking``."""
+        acquired = self._slots.acquire() if blocking else self._slots.acquire(
+            timeout=self.queue_timeout if timeout is None else timeout)
+        if not acquired:
+            raise HashingBusy(f"Hashing queue is full ({self.queue_depth} jobs)")
+        return self._submit(fn, *args)
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    def map(self, fn, items, window=None):
+        """
+        Lazily yields ``fn(item)`` in order for batch jobs. At most ``window`` (default: one per worker)
+        jobs are in flight, so a bulk job waits for slots instead of filling the queue logins need.
+        """
+        window = window or self.max_workers
+        in_flight = deque()
+        for item in items:
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+            in_flight.append(self.submit(fn, item, blocking=True))
+        while in_flight:
+            yield in_flight.popleft().result()
+
+    async def arun(self, fn, *args):
+        deadline = time.monotonic() + self.queue_timeout
+        waiting = asyncio.get_running_loop().run_in_executor(self._waiters, self._acquire_until, deadline)
+        try:
+            acquired = await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            # the waiter thread may still get a slot after we gave up: hand it straight back
+            waiting.add_done_callback(lambda f: not f.cancelled() and f.result() and self._slots.release())
+            raise
+        if not acquired:
+            raise HashingBusy(f"Hashing queue is full ({self.queue_depth} jobs)")
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def _acquire_until(self, deadline):
+        # measured from the call, so time spent queued for a waiter thread counts against the timeout
+        return self._slots.acquire(timeout=max(deadline - time.monotonic(), 0))
+
+    def shutdown(self, wait=True):
+        self._waiters.shutdown(wait=wait)
+        self._executor.shutdown(wait=wait)
+
+
+@cache
+def get_hashing_service() -> HashingService:
+    return HashingService.from_settings()
@@ -0,0 +1,52 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from Sodia.testing import isolated_caches
+from users import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Seeds a throwaway test database with a synthetic school and benchmarks the auth and profile hot paths."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--sessions-per-user", type=int, default=2)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--logins", type=int, default=20)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def handle(self, *args, users, sessions_per_user, requests, logins, concurrency, seed, output, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # the seeded rows only exist in the test database, so keep what they cache out of the shared cache
+            with isolated_caches():
+                results = benchmarks.run(users=users, sessions_per_user=sessions_per_user, requests=requests,
+                                         logins=logins, concurrency=concurrency, seed_value=seed)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        results["commit"] = self.current_commit()
+
+        self.stdout.write(f"{'scenario':<28}{'ops':>7}{'ops/s':>10}{'q/op':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for scenario in results["scenarios"]:
+            self.stdout.write(f"{scenario['name']:<28}{scenario['operations']:>7}{scenario['ops_per_second']:>10}"
+                              f"{scenario['queries_per_operation']:>7}{scenario['p50_ms']:>9}"
+                              f"{scenario['p95_ms']:>9}{scenario['p99_ms']:>9}")
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    @staticmethod
+    def current_commit():
+        try:
+            return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
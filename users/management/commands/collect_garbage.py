@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.gc import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Deletes expired sessions and acknowledged session updates in bounded chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--time-budget", type=float, help="Stop after roughly this many seconds")
+
+    def handle(self, *args, chunk_size, time_budget, **options):
+        self.stdout.write(self.style.SUCCESS(str(collect_garbage(chunk_size=chunk_size, time_budget=time_budget))))
@@ -0,0 +1,47 @@
+import csv
+import json
+import sys
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Creates users from a CSV (with a header row) or JSON Lines roster with first_name, last_name, email, " \
+           "password and optional User fields."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Roster file, or - for stdin")
+        parser.add_argument("--format", choices=("csv", "jsonl"), help="Defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--limit", type=int, help="Only import the first N rows")
+
+    def handle(self, *args, path, format, batch_size, limit, **options):
+        format = format or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            rows = self.read_csv(stream) if format == "csv" else self.read_jsonl(stream)
+            result = User.objects.create_users(islice(rows, limit), batch_size=batch_size)
+        except (OSError, csv.Error, json.JSONDecodeError) as e:
+            raise CommandError(e) from e
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for index, row, error in result.failures:
+            self.stderr.write(f"row {index + 1} ({row.get('email', '')}): {error}")
+        self.stdout.write(self.style.SUCCESS(f"Created {len(result.created)} users")
+                          + (f", {len(result.failures)} failed" if result.failures else ""))
+
+    @staticmethod
+    def read_csv(stream):
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if value not in (None, "")}
+
+    @staticmethod
+    def read_jsonl(stream):
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.matching import rematch_all, rematch_user
+
+
+class Command(BaseCommand):
+    help = "Recomputes challenge partners for the whole school, or incrementally for one user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only rematch this user (and whoever they were paired with)")
+
+    def handle(self, *args, user, **options):
+        started = time.perf_counter()
+        pairing, changed = rematch_user(user) if user else rematch_all()
+        paired = sum(partner is not None for partner in pairing.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Paired {paired} of {len(pairing)} users, {changed} changed, in {time.perf_counter() - started:.2f}s"))
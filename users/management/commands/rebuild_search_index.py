@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from settings.models import UserAccountSettings
+from users.search import index_accounts
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the profile search tables from UserAccountSettings, e.g. after rows were changed with update()."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, batch_size, **options):
+        accounts = (UserAccountSettings.objects.only("user_id", "username", "display_name", "first_name", "last_name")
+                    .order_by("pk").iterator(chunk_size=batch_size))
+        batch, indexed = [], 0
+        for account in accounts:
+            batch.append(account)
+            if len(batch) >= batch_size:
+                index_accounts(batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            index_accounts(batch)
+            indexed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} profiles"))
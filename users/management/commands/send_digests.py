@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from users.notifications import send_due_digests
+
+
+class Command(BaseCommand):
+    help = "Sends notification digests to every user whose digest is due."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=100)
+        parser.add_argument("--time-budget", type=float, help="Stop after roughly this many seconds; "
+                                                               "the next run picks up where this one stopped")
+
+    def handle(self, *args, chunk_size, time_budget, **options):
+        self.stdout.write(self.style.SUCCESS(str(send_due_digests(chunk_size=chunk_size, time_budget=time_budget))))
@@ -0,0 +1,214 @@
+"""
+Challenge-partner matching.
+
+Every user with challenge settings becomes one row of a ``FeatureMatrix``: compact NumPy arrays for
+the blocking keys (frequency, gender/gender filter bits, year group) and a row-normalised one-hot
+profile (house, boarding type, country). Candidates are only ever scored within a frequency bucket
+(split further by year group when a bucket is too large), with mutual gender filters applied as a
+vectorised bit mask. Every compatible pair of a block is then taken greedily by descending score;
+since scores are symmetric, that pairing is stable: no two users would both rather be with each
+other than with their partners.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from settings.models import UserChallengesSettings, FrequencySetting, GenderFilter
+from .models import User
+
+GENDER_BITS = {
+    "male": GenderFilter.MALE, "m": GenderFilter.MALE,
+    "female": GenderFilter.FEMALE, "f": GenderFilter.FEMALE,
+}
+
+
+def gender_bit(gender):
+    return int(GENDER_BITS.get((gender or "").strip().lower(), GenderFilter.OTHER))
+
+
+class FeatureMatrix:
+    COLUMNS = (
+        "user_id", "frequency", "gender_filter", "subjects_match", "interests_match",
+        "user__account_settings__gender", "user__account_settings__year_group_id",
+        "user__account_settings__house_id", "user__account_settings__boarding_type",
+        "user__account_settings__country_id", "user__challenge_partner_id",
+    )
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: row[0])  # deterministic order -> deterministic tie-breaks
+        n = len(rows)
+        self.ids = [row[0] for row in rows]
+        self.index = {user_id: i for i, user_id in enumerate(self.ids)}
+        self.partner_ids = [row[10] for row in rows]
+        self.frequency = np.fromiter((int(row[1]) for row in rows), dtype=np.int16, count=n)
+        self.gender_filter = np.fromiter((int(row[2]) for row in rows), dtype=np.int8, count=n)
+        self.gender = np.fromiter((gender_bit(row[5]) for row in rows), dtype=np.int8, count=n)
+        self.subjects_weight = np.fromiter((row[3] for row in rows), dtype=np.float32, count=n)
+        self.interests_weight = np.fromiter((row[4] for row in rows), dtype=np.float32, count=n)
+        self.year = np.fromiter((-1 if row[6] is None else row[6] for row in rows), dtype=np.int16, count=n)
+
+        # one-hot profile: house, boarding type, country; missing values simply contribute nothing
+        columns = {}
+        profile = [[columns.setdefault((kind, value), len(columns)) for kind, value in
+                    (("house", row[7]), ("boarding", row[8] and int(row[8])), ("country", row[9]))
+                    if value is not None] for row in rows]
+        self.profile = np.zeros((n, max(len(columns), 1)), dtype=np.float32)
+        for i, hot in enumerate(profile):
+            self.profile[i, hot] = 1.0
+        norms = np.linalg.norm(self.profile, axis=1, keepdims=True)
+        np.divide(self.profile, norms, out=self.profile, where=norms > 0)
+
+        year_known = self.year[self.year >= 0]
+        self.year_span = max(int(year_known.max() - year_known.min()), 1) if year_known.size else 1
+
+    @classmethod
+    def load(cls, queryset=None):
+        queryset = UserChallengesSettings.objects.all() if queryset is None else queryset
+        return cls(queryset.exclude(frequency=FrequencySetting.NEVER).values_list(*cls.COLUMNS))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def blocks(self, max_block_size):
+        """Candidate index: user indices grouped by frequency bucket, then by year group for oversized buckets."""
+        by_frequency = defaultdict(list)
+        for i, frequency in enumerate(self.frequency):
+            by_frequency[int(frequency)].append(i)
+        for members in by_frequency.values():
+            if len(members) <= max_block_size:
+                yield np.array(members)
+                continue
+            by_year = defaultdict(list)
+            for i in members:
+                by_year[int(self.year[i])].append(i)
+            yield from (np.array(year_members) for year_members in by_year.values())
+
+    def scores(self, rows, cols):
+        """Score matrix for ``rows`` x ``cols`` (index arrays); incompatible pairs and self-pairs are -inf."""
+        profile_similarity = self.profile[rows] @ self.profile[cols].T
+        year_gap = np.abs(self.year[rows, None] - self.year[None, cols]).astype(np.float32)
+        year_similarity = np.where((self.year[rows, None] < 0) | (self.year[None, cols] < 0),
+                                   0.0, 1.0 - np.minimum(year_gap / self.year_span, 1.0))
+        subjects_weight = (self.subjects_weight[rows, None] + self.subjects_weight[None, cols]) / 2
+        interests_weight = (self.interests_weight[rows, None] + self.interests_weight[None, cols]) / 2
+        scores = 1.0 + subjects_weight * year_similarity + interests_weight * profile_similarity
+
+        compatible = (((self.gender_filter[rows, None] & self.gender[None, cols]) != 0)
+                      & ((self.gender_filter[None, cols] & self.gender[rows, None]) != 0)
+                      & (rows[:, None] != cols[None, :]))
+        return np.where(compatible, scores, -np.inf).astype(np.float32)
+
+
+PAIR_CHUNK = 4096
+
+
+class MatchingEngine:
+    # a block's pairs are all sorted at once: 2000 users are ~2M pairs
+    MAX_BLOCK_SIZE = 2000
+
+    def __init__(self, features: FeatureMatrix, max_block_size=MAX_BLOCK_SIZE):
+        self.features = features
+        self.max_block_size = max_block_size
+
+    def match_all(self) -> dict:
+        """Returns user_id -> partner user_id (or None) for every user in the matrix."""
+        partner = np.full(len(self.features), -1, dtype=np.int64)
+        for block in self.features.blocks(self.max_block_size):
+            if len(block) >= 2:
+                self._pair(block, self.features.scores(block, block), partner)
+        ids = self.features.ids
+        return {user_id: ids[partner[i]] if partner[i] >= 0 else None for i, user_id in enumerate(ids)}
+
+    @staticmethod
+    def _pair(block, scores, partner):
+        # only considering each user's top candidates would leave blocking pairs behind
+        a, b = np.triu_indices(len(block), 1)
+        pair_scores = scores[a, b]
+        keep = np.isfinite(pair_scores)
+        a, b, pair_scores = a[keep], b[keep], pair_scores[keep]
+        order = np.lexsort((b, a, -pair_scores))
+        a, b = block[a[order]], block[b[order]]
+        for start in range(0, len(a), PAIR_CHUNK):
+            # drop pairs with an already paired user in bulk, then walk the rest in order
+            ca, cb = a[start:start + PAIR_CHUNK], b[start:start + PAIR_CHUNK]
+            free = (partner[ca] < 0) & (partner[cb] < 0)
+            for ui, uj in zip(ca[free].tolist(), cb[free].tolist()):
+                if partner[ui] < 0 and partner[uj] < 0:
+                    partner[ui], partner[uj] = uj, ui
+            if (partner[block] < 0).sum() < 2:
+                break
+
+    def best_partner(self, user_id, available):
+        """Highest scoring compatible user among ``available`` ids, or None."""
+        features = self.features
+        i = features.index.get(user_id)
+        if i is None:
+            return None
+        candidates = np.array([features.index[other] for other in available if other in features.index],
+                              dtype=np.int64)
+        candidates = candidates[features.frequency[candidates] == features.frequency[i]]
+        if not candidates.size:
+            return None
+        row = features.scores(np.array([i]), candidates)[0]
+        best = int(np.argmax(row))
+        return features.ids[candidates[best]] if np.isfinite(row[best]) else None
+
+
+def apply_pairing(pairing: dict):
+    """Persists ``user_id -> partner_id``; only changed users are written, and their streak restarts."""
+    current = dict(User.objects.filter(pk__in=list(pairing)).values_list("pk", "challenge_partner_id"))
+    changed = [User(pk=user_id, challenge_partner_id=partner_id, challenge_streak=0)
+               for user_id, partner_id in pairing.items() if current.get(user_id) != partner_id]
+    if not changed:
+        return 0
+    with transaction.atomic():
+        # challenge_partner is unique: clear first so swapped partners never collide mid-update
+        User.objects.filter(pk__in=[user.pk for user in changed]).update(challenge_partner=None)
+        User.objects.bulk_update(changed, ["challenge_partner", "challenge_streak"], batch_size=500)
+    return len(changed)
+
+
+def rematch_all():
+    features = FeatureMatrix.load()
+    pairing = MatchingEngine(features).match_all()
+    # users who opted out (NEVER) are not in the matrix but may still hold a partner
+    pairing.update(dict.fromkeys(User.objects.filter(challenges_settings__frequency=FrequencySetting.NEVER,
+                                                     challenge_partner__isnull=False).values_list("pk", flat=True)))
+    return pairing, apply_pairing(pairing)
+
+
+def rematch_user(user_id):
+    """
+    Incremental rematch after one user's settings changed: the user and their old partner are
+    released, then each is paired with the best compatible user who currently has no partner.
+    """
+    user_id = User._meta.pk.to_python(user_id)
+    old_partner = User.objects.filter(pk=user_id).values_list("challenge_partner_id", flat=True).first()
+    released = [user_id] + ([old_partner] if old_partner else [])
+    # only the released users and the unpaired users they could be matched with, not the whole school
+    frequencies = UserChallengesSettings.objects.filter(user_id__in=released).values_list("frequency", flat=True)
+    features = FeatureMatrix.load(UserChallengesSettings.objects.filter(
+        Q(user_id__in=released) | Q(frequency__in=list(frequencies), user__challenge_partner__isnull=True)))
+    engine = MatchingEngine(features)
+    available = set(features.ids) | set(released)
+    pairing = dict.fromkeys(released)
+    for released_id in released:
+        if pairing.get(released_id) is not None:
+            continue
+        available.discard(released_id)
+        best = engine.best_partner(released_id, available)
+        if best is not None:
+            available.discard(best)
+            pairing[released_id], pairing[best] = best, released_id
+    return pairing, apply_pairing(pairing)
+
+
+MATCHING_FIELDS = {"frequency", "gender_filter", "subjects_match", "interests_match"}
+
+
+def challenges_settings_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not MATCHING_FIELDS & set(update_fields)):
+        return
+    transaction.on_commit(lambda: rematch_user(instance.user_id))
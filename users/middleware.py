@@ -1,12 +1,16 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.http import HttpRequest, HttpResponse
 
-from .models import Session
+from .gc import get_periodic_gc
+from .sessions import get_session_toucher, get_session_cache
 
 
 class AuthData:
     def __init__(self, session=None, user=None):
         self.session = session
         self.user = user
+        self.profile = None  # users.profiles.ProfileBundle, memoised by ProfileBundle.for_request
+        self.cache_key = None  # memoised by users.page_cache.auth_cache_key
 
 
 def get_client_ip(request):
@@ -17,31 +21,57 @@ def get_client_ip(request):
 
 
 class AuthenticationMiddleware:
+    """
+    Resolves the ``auth`` cookie to ``request.auth``. Runs natively in both modes: under ASGI the
+    session is resolved and touched with the async ORM/cache API, so requests never hop threads.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.toucher = get_session_toucher()
+        self.sessions = get_session_cache()
+        periodic_gc = get_periodic_gc()
+        if periodic_gc is not None:
+            periodic_gc.start()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
-        user = None
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         session_token = request.COOKIES.get("auth")
         if not session_token:
             return self.get_response(request)
-        try:
-            session = Session.objects.select_related("user").get(token=session_token)
-        except Session.DoesNotExist:
-            session = None
+        session = self.sessions.resolve(session_token)
         if session:
             if session.is_valid():
-                session.last_request_ip = get_client_ip(request)
-                session.expire_at = Session.objects.new_expires_at()
-                session.save()
-                user = session.user
+                if self.toucher.touch(session, get_client_ip(request)):
+                    self.sessions.set(session)
+            else:
+                session = None  # left for users.gc to delete
+
+        request.auth = AuthData(session=session, user=session.user if session else None)
+        return self.clear_stale_cookie(session, self.get_response(request))
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        session_token = request.COOKIES.get("auth")
+        if not session_token:
+            return await self.get_response(request)
+        session = await self.sessions.aresolve(session_token)
+        if session:
+            if session.is_valid():
+                if await self.toucher.atouch(session, get_client_ip(request)):
+                    await self.sessions.aset(session)
             else:
-                session.delete()
                 session = None
 
-        request.auth = AuthData(session=session, user=user)
-        response: HttpResponse = self.get_response(request)
-        if session_token and session is None:
-            if not response.cookies.get("auth"):
-                response.delete_cookie("auth")
+        request.auth = AuthData(session=session, user=session.user if session else None)
+        return self.clear_stale_cookie(session, await self.get_response(request))
+
+    @staticmethod
+    def clear_stale_cookie(session, response):
+        if session is None and not response.cookies.get("auth"):
+            response.delete_cookie("auth")
         return response
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:50
+
+import Sodia.models
+import django.db.models.deletion
+import django.utils.timezone
+import users.models
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('is_activated', models.BooleanField(default=False)),
+                ('flag', Sodia.models.IntFlagField(choices=[(1, 'unsafe'), (2, 'new'), (4, 'safe')], default=users.models.AccountFlag['UNSAFE'], enum_class=users.models.AccountFlag)),
+                ('challenge_streak', models.IntegerField(default=0)),
+                ('is_pressing_sodia_button', models.BooleanField(default=False)),
+                ('challenge_partner', models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.user')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserLoginDetails',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='login_details', serialize=False, to='users.user')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('is_email_verified', models.BooleanField(default=False)),
+                ('email_changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('password', users.models.PasswordField()),
+                ('password_changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Session',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(default=users.models.SessionManager.generate_session_token, max_length=255, unique=True)),
+                ('last_request_ip', models.GenericIPAddressField()),
+                ('last_request_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField(default=users.models.SessionManager.new_expires_at)),
+                ('next_update_number', models.IntegerField(default=0)),
+                ('acknowledged_update_number', models.IntegerField(default=-1)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.user')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SessionUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('update_number', models.IntegerField(default=0)),
+                ('update_message', models.TextField()),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.session')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationDigest',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_digest', serialize=False, to='users.user')),
+                ('next_due_at', models.DateTimeField(null=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('last_sent_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['next_due_at'], name='users_notif_next_du_edefa2_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=30)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='users_notif_user_id_3cadac_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['user', 'expires_at'], name='users_sessi_user_id_a02223_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['expires_at'], name='users_sessi_expires_16cf8c_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='sessionupdate',
+            constraint=models.UniqueConstraint(fields=('session', 'update_number'), name='unique_session_update_number'),
+        ),
+    ]
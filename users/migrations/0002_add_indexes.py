@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_pressing_sodia_button', True)), fields=['is_pressing_sodia_button'], name='users_user_pressing_idx'),
+        ),
+    ]
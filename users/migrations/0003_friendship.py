@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:57
+
+import Sodia.models
+import django.db.models.deletion
+import users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_add_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Friendship',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', Sodia.models.IntFlagField(choices=[(1, 'pending'), (2, 'accepted')], default=users.models.FriendshipStatus['PENDING'], enum_class=users.models.FriendshipStatus)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('accepted_at', models.DateTimeField(null=True)),
+                ('from_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.user')),
+                ('to_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['to_user', 'status'], name='users_frien_to_user_db034b_idx')],
+                'constraints': [models.UniqueConstraint(fields=('from_user', 'to_user'), name='unique_friendship'), models.CheckConstraint(condition=models.Q(('from_user', models.F('to_user')), _negated=True), name='friendship_not_self')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:59
+
+import Sodia.models
+import django.db.models.deletion
+import users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_friendship'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', Sodia.models.IntFlagField(choices=[(1, 'username'), (2, 'display_name'), (4, 'full_name')], enum_class=users.models.SearchSource)),
+                ('term', models.CharField(max_length=100)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term'], name='users_searc_term_c42c1a_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', Sodia.models.IntFlagField(choices=[(1, 'username'), (2, 'display_name'), (4, 'full_name')], enum_class=users.models.SearchSource)),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram'], name='users_searc_trigram_72eb01_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:12
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_search'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Least('from_user', 'to_user'), django.db.models.functions.comparison.Greatest('from_user', 'to_user'), name='unique_friendship_pair'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from collections import Counter
+
+from django.db import migrations
+
+
+def normalise_emails(apps, schema_editor):
+    # Lower-cases and trims every stored email, as UserManager.normalize_email now does on signup.
+    # Addresses registered more than once in different cases are left untouched: they belong to
+    # separate accounts that have to be merged by hand.
+    UserLoginDetails = apps.get_model("users", "UserLoginDetails")
+    rows = list(UserLoginDetails.objects.only("email"))
+    counts = Counter(row.email.strip().lower() for row in rows)
+    changed = []
+    for row in rows:
+        email = row.email.strip().lower()
+        if email != row.email and counts[email] == 1:
+            row.email = email
+            changed.append(row)
+    UserLoginDetails.objects.bulk_update(changed, ["email"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_friendship_pair'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalise_emails, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,18 @@
+from collections import Counter
+from dataclasses import dataclass, field
 from datetime import timedelta
 from enum import IntFlag, auto
 import secrets
 import uuid
 
+from .hashing import get_hashing_service
 from .passwords import Password
 
-from django.db import models, transaction
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import models, transaction, IntegrityError
+from django.db.models import Q
+from django.db.models.functions import Least, Greatest
 from django.utils import timezone
 
 from Sodia.models import IntFlagField
@@ -13,7 +20,6 @@ from settings.models import UserAccountSettings, UserPrivacySettings, UserNotifi
 
 
 # TODO: make __str__
-# TODO: add indexes
 
 class AccountFlag(IntFlag):
     UNSAFE = auto()
@@ -21,9 +27,43 @@ class AccountFlag(IntFlag):
     SAFE = auto()
 
 
-class UserManager(models.Manager):
+class FriendshipStatus(IntFlag):
+    PENDING = auto()
+    ACCEPTED = auto()
+
+
+class SearchSource(IntFlag):
+    USERNAME = auto()
+    DISPLAY_NAME = auto()
+    FULL_NAME = auto()
+
+
+@dataclass
+class BulkCreateResult:
+    created: list = field(default_factory=list)
+    failures: list[tuple[int, dict, str]] = field(default_factory=list)  # (row index, row, error)
+
+
+class UserQuerySet(models.QuerySet):
+    def with_profile(self, use_case="profile"):
+        """Joins every settings relation ``use_case`` needs (see ``users.profiles.PROFILE_USE_CASES``)."""
+        from .profiles import PROFILE_USE_CASES
+        relations, fields = PROFILE_USE_CASES[use_case]
+        queryset = self.select_related(*relations)
+        return queryset.only(*fields) if fields else queryset
+
+
+class UserManager(models.Manager.from_queryset(UserQuerySet)):
+    REQUIRED_FIELDS = ("first_name", "last_name", "email", "password")
+
+    @staticmethod
+    def normalize_email(email):
+        """The form ``UserLoginDetails.email`` is stored and looked up in."""
+        return email.strip().lower()
+
     @transaction.atomic
     def create_user(self, *, first_name, last_name, email, password, **kwargs):
+        email = self.normalize_email(email)
         user = self.create(**kwargs)
         UserLoginDetails.objects.create(user=user, email=email, password=password)
         username = email.split('@')[0][:UserAccountSettings._meta.get_field("username").max_length]
@@ -33,6 +73,117 @@ class UserManager(models.Manager):
         UserChallengesSettings.objects.create(user=user)
         return user
 
+    def create_users(self, rows, batch_size=500) -> BulkCreateResult:
+        """
+        Bulk ``create_user`` for roster imports. ``rows`` is any iterable of ``create_user`` keyword
+        dicts and is consumed one chunk at a time; each chunk is hashed on the hashing pool and
+        written with one ``bulk_create`` per table in its own transaction. Bad rows are reported in
+        the result instead of aborting the import; username collisions get a numeric suffix.
+        """
+        result = BulkCreateResult()
+        seen_emails = set()
+        chunk = []
+        for index, row in enumerate(rows):
+            chunk.append((index, row))
+            if len(chunk) >= batch_size:
+                self._create_chunk(chunk, seen_emails, result)
+                chunk = []
+        if chunk:
+            self._create_chunk(chunk, seen_emails, result)
+        return result
+
+    def _create_chunk(self, chunk, seen_emails, result):
+        valid = []
+        for index, row in chunk:
+            try:
+                missing = [name for name in self.REQUIRED_FIELDS if not row.get(name)]
+                if missing:
+                    raise ValidationError(f"Missing fields: {', '.join(missing)}")
+                email = self.normalize_email(row["email"])
+                validate_email(email)
+                if email in seen_emails:
+                    raise ValidationError(f"Duplicate email: {email}")
+                seen_emails.add(email)
+                valid.append((index, {**row, "email": email}))
+            except ValidationError as e:
+                result.failures.append((index, row, "; ".join(e.messages)))
+        existing = set(UserLoginDetails.objects.filter(email__in=[row["email"] for _, row in valid])
+                       .values_list("email", flat=True))
+        for index, row in [(index, row) for index, row in valid if row["email"] in existing]:
+            result.failures.append((index, row, f"Email already registered: {row['email']}"))
+        valid = [(index, row) for index, row in valid if row["email"] not in existing]
+
+        passwords = get_hashing_service().map(self._hash_password, [row["password"] for _, row in valid])
+        usernames = self._unique_usernames([row["email"].split("@")[0] for _, row in valid])
+        prepared = []
+        for (index, row), password, username in zip(valid, passwords, usernames):
+            if isinstance(password, Exception):
+                result.failures.append((index, row, f"Could not hash password: {password}"))
+                continue
+            extra = {k: v for k, v in row.items() if k not in self.REQUIRED_FIELDS}
+            try:
+                user = self.model(**extra)
+            except (TypeError, ValueError) as e:
+                result.failures.append((index, row, str(e)))
+                continue
+            prepared.append((index, row, user, password, username))
+        try:
+            with transaction.atomic():
+                self._bulk_insert(prepared)
+            result.created.extend(user for _, _, user, _, _ in prepared)
+        except IntegrityError:
+            # lost a race with a concurrent signup: fall back to one savepoint per row to find the culprits
+            for item in prepared:
+                try:
+                    with transaction.atomic():
+                        self._bulk_insert([item])
+                    result.created.append(item[2])
+                except IntegrityError as e:
+                    result.failures.append((item[0], item[1], str(e)))
+
+    @staticmethod
+    def _hash_password(raw):
+        # returned rather than raised, so one bad row does not abort the rest of the chunk
+        try:
+            return Password.from_password(raw).hash()
+        except Exception as e:
+            return e
+
+    def _bulk_insert(self, prepared):
+        users = self.bulk_create([user for _, _, user, _, _ in prepared])
+        UserLoginDetails.objects.bulk_create(
+            UserLoginDetails(user=user, email=row["email"], password=password)
+            for _, row, user, password, _ in prepared)
+        accounts = UserAccountSettings.objects.bulk_create(
+            UserAccountSettings(user=user, username=username, first_name=row["first_name"], last_name=row["last_name"])
+            for _, row, user, _, username in prepared)
+        for model in (UserPrivacySettings, UserNotificationSettings, UserChallengesSettings):
+            model.objects.bulk_create(model(user=user) for user in users)
+        from .search import index_accounts  # bulk_create sends no post_save
+        index_accounts(accounts)
+
+    @staticmethod
+    def _unique_usernames(bases):
+        """Resolves collisions against the database and within ``bases`` with two queries at most."""
+        max_length = UserAccountSettings._meta.get_field("username").max_length
+        bases = [base[:max_length] for base in bases]
+        taken = set(UserAccountSettings.objects.filter(username__in=set(bases)).values_list("username", flat=True))
+        colliding = {base for base, count in Counter(bases).items() if count > 1 or base in taken}
+        if colliding:
+            prefixes = Q()
+            for base in colliding:
+                prefixes |= Q(username__startswith=base[:max_length - 4])
+            taken.update(UserAccountSettings.objects.filter(prefixes).values_list("username", flat=True))
+        usernames = []
+        for base in bases:
+            username, suffix = base, 1
+            while username in taken:
+                suffix += 1
+                username = base[:max_length - len(str(suffix))] + str(suffix)
+            taken.add(username)
+            usernames.append(username)
+        return usernames
+
 
 class User(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -46,6 +197,13 @@ class User(models.Model):
 
     objects = UserManager()
 
+    class Meta:
+        indexes = [
+            # only the few users pressing right now are indexed
+            models.Index(fields=["is_pressing_sodia_button"], condition=Q(is_pressing_sodia_button=True),
+                         name="users_user_pressing_idx"),
+        ]
+
 
 class PasswordField(models.CharField):
     def __init__(self, *args, **kwargs):
@@ -71,7 +229,7 @@ class PasswordField(models.CharField):
     def get_prep_value(self, value):
         if value is None:
             return None
-        return str(value)
+        return str(self.to_python(value))
 
 
 class UserLoginDetails(models.Model):
@@ -82,6 +240,21 @@ class UserLoginDetails(models.Model):
     password = PasswordField()
     password_changed_at = models.DateTimeField(default=timezone.now)
 
+    def check_password(self, password):
+        if not self.password.verify(password):
+            return False
+        if self.password.is_pending:  # verify() upgraded an outdated hash
+            self.save(update_fields=["password"])
+        return True
+
+    async def acheck_password(self, password):
+        if not await self.password.averify(password):
+            return False
+        if self.password.is_pending:
+            await get_hashing_service().arun(self.password.hash)
+            await self.asave(update_fields=["password"])
+        return True
+
 
 class SessionManager(models.Manager):
     DEFAULT_TTL = timedelta(days=7)
@@ -91,7 +264,7 @@ class SessionManager(models.Manager):
         return timezone.now() + cls.DEFAULT_TTL
 
     @staticmethod
-    def generate_session_token(self):
+    def generate_session_token():
         return secrets.token_urlsafe(32)
 
 
@@ -104,15 +277,25 @@ class Session(models.Model):
     last_request_at = models.DateTimeField(auto_now=True)
     expires_at = models.DateTimeField(default=objects.new_expires_at)
     next_update_number = models.IntegerField(default=0)
+    acknowledged_update_number = models.IntegerField(default=-1)  # updates up to this one may be deleted
 
     class Meta:
         indexes = [
             models.Index(fields=["user", "expires_at"]),
+            models.Index(fields=["expires_at"]),
         ]
 
     def is_valid(self):
         return timezone.now() < self.expires_at
 
+    def rotate_token(self):
+        from .sessions import get_session_cache
+        old_token = self.token
+        self.token = Session.objects.generate_session_token()
+        self.save(update_fields=["token"])
+        get_session_cache().invalidate(old_token)
+        return self.token
+
 
 class SessionUpdate(models.Model):
     session = models.ForeignKey(Session, on_delete=models.CASCADE)
@@ -123,3 +306,137 @@ class SessionUpdate(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['session', 'update_number'], name='unique_session_update_number'),
         ]
+
+
+class NotificationEvent(models.Model):
+    """Append-only log of things to tell a user about; ``kind`` is a ``UserNotificationSettings`` field name."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(max_length=30)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"]),
+        ]
+
+
+class NotificationDigest(models.Model):
+    """Per-user digest cursor: events after ``last_event_id`` go out in the digest due at ``next_due_at``."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="notification_digest", primary_key=True)
+    next_due_at = models.DateTimeField(null=True)  # None while nothing is pending
+    last_event_id = models.BigIntegerField(default=0)
+    last_sent_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["next_due_at"]),
+        ]
+
+
+class FriendshipManager(models.Manager):
+    def between(self, user_id, other_id):
+        return self.filter(Q(from_user_id=user_id, to_user_id=other_id) | Q(from_user_id=other_id, to_user_id=user_id))
+
+    @transaction.atomic
+    def request(self, from_user_id, to_user_id):
+        """Sends a friend request; requesting someone who already asked you accepts theirs instead."""
+        if from_user_id == to_user_id:
+            raise ValueError("Users cannot befriend themselves")
+        existing = self.between(from_user_id, to_user_id).select_for_update().first()
+        if existing is None:
+            try:
+                with transaction.atomic():
+                    friendship = self.create(from_user_id=from_user_id, to_user_id=to_user_id)
+            except IntegrityError:
+                # a concurrent request for the same pair won the insert (there was no row to lock)
+                existing = self.between(from_user_id, to_user_id).select_for_update().get()
+            else:
+                self._notify(to_user_id, from_user_id, "new_friend_requests", "{} sent you a friend request")
+                return friendship
+        if existing.status == FriendshipStatus.PENDING and existing.to_user_id == from_user_id:
+            return self.accept(existing)
+        return existing
+
+    @transaction.atomic
+    def accept(self, friendship):
+        if friendship.status == FriendshipStatus.ACCEPTED:
+            return friendship
+        friendship.status = FriendshipStatus.ACCEPTED
+        friendship.accepted_at = timezone.now()
+        friendship.save(update_fields=["status", "accepted_at"])
+        self._notify(friendship.from_user_id, friendship.to_user_id, "accepted_friend_requests",
+                     "{} accepted your friend request")
+        return friendship
+
+    def remove(self, user_id, other_id):
+        """Unfriends, or declines/withdraws a pending request; ``post_delete`` still fires for the row."""
+        return self.between(user_id, other_id).delete()[0]
+
+    def friend_id_map(self, user_ids) -> dict:
+        """user_id -> set of friend ids for every id in ``user_ids``, in one query."""
+        user_ids = list(user_ids)
+        friends = {user_id: set() for user_id in user_ids}
+        for from_user_id, to_user_id in (self.filter(Q(from_user_id__in=user_ids) | Q(to_user_id__in=user_ids),
+                                                     status=FriendshipStatus.ACCEPTED)
+                                         .values_list("from_user_id", "to_user_id")):
+            if from_user_id in friends:
+                friends[from_user_id].add(to_user_id)
+            if to_user_id in friends:
+                friends[to_user_id].add(from_user_id)
+        return friends
+
+    @staticmethod
+    def _notify(user_id, actor_id, kind, message):
+        from .notifications import notify
+        username = UserAccountSettings.objects.filter(user_id=actor_id).values_list("username", flat=True).first()
+        notify([user_id], kind, message.format(username or "Someone"))
+
+
+class Friendship(models.Model):
+    """A friend request from ``from_user`` to ``to_user``; one row per pair, whichever side asked first."""
+    from_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    to_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    status = IntFlagField(enum_class=FriendshipStatus, exclusive_choices=True, default=FriendshipStatus.PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    accepted_at = models.DateTimeField(null=True)
+
+    objects = FriendshipManager()
+
+    class Meta:
+        constraints = [
+            # also the index for "requests/friends where I am from_user"
+            models.UniqueConstraint(fields=["from_user", "to_user"], name="unique_friendship"),
+            # one row per pair whichever way round: A->B and B->A cannot both be inserted
+            models.UniqueConstraint(Least("from_user", "to_user"), Greatest("from_user", "to_user"),
+                                    name="unique_friendship_pair"),
+            models.CheckConstraint(condition=~Q(from_user=models.F("to_user")), name="friendship_not_self"),
+        ]
+        indexes = [
+            # incoming requests and the reverse side of friend lookups
+            models.Index(fields=["to_user", "status"]),
+        ]
+
+
+class SearchTerm(models.Model):
+    """One normalised word of a user's names, for indexed prefix search (see ``users.search``)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    source = IntFlagField(enum_class=SearchSource, exclusive_choices=True)
+    term = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["term"]),
+        ]
+
+
+class SearchTrigram(models.Model):
+    """One trigram of a ``SearchTerm``, for fuzzy matching."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    source = IntFlagField(enum_class=SearchSource, exclusive_choices=True)
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["trigram"]),
+        ]
@@ -0,0 +1,140 @@
+"""
+Notification digests.
+
+``notify()`` appends events and, per user, schedules the next digest according to
+``UserNotificationSettings.digest_frequency`` (``NotificationDigest.next_due_at`` is indexed, so
+finding due users never scans the event log). ``send_due_digests()`` works through due users in
+chunks: one query for their pending events, one mail connection for their digests, one
+``bulk_update`` to advance their cursors. A crashed or time-boxed run resumes from the cursors,
+re-sending at most the chunk that was in flight. Mail goes through ``EMAIL_BACKEND``, so the
+console and file backends work as local stand-ins.
+"""
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from settings.models import UserNotificationSettings, FrequencySetting
+from .models import NotificationEvent, NotificationDigest
+
+DIGEST_DELAYS = {
+    FrequencySetting.IMMEDIATE: timedelta(0),
+    FrequencySetting.DAY: timedelta(days=1),
+    FrequencySetting.THREE_DAYS: timedelta(days=3),
+    FrequencySetting.WEEK: timedelta(weeks=1),
+}
+KINDS = {f.name: f.verbose_name.capitalize() for f in UserNotificationSettings._meta.get_fields()
+         if f.name not in ("user", "digest_frequency")}
+
+
+def notify(user_ids, kind, message) -> int:
+    """Queues ``message`` for every user in ``user_ids`` who has ``kind`` enabled; returns how many."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown notification kind: {kind}")
+    now = timezone.now()
+    delays = {user_id: DIGEST_DELAYS[frequency] for user_id, frequency in
+              UserNotificationSettings.objects.filter(user_id__in=list(user_ids), **{kind: True})
+              .exclude(digest_frequency=FrequencySetting.NEVER).values_list("user_id", "digest_frequency")}
+    if not delays:
+        return 0
+    with transaction.atomic():
+        NotificationEvent.objects.bulk_create(
+            NotificationEvent(user_id=user_id, kind=kind, message=message) for user_id in delays)
+        # locked, so this either runs before send_due_digests settles these rows or sees what it wrote
+        digests = {digest.user_id: digest for digest in
+                   NotificationDigest.objects.select_for_update().filter(user_id__in=list(delays))}
+        NotificationDigest.objects.bulk_create(
+            [NotificationDigest(user_id=user_id, next_due_at=now + delay) for user_id, delay in delays.items()
+             if user_id not in digests], ignore_conflicts=True)
+        scheduled = []
+        for digest in digests.values():
+            if digest.next_due_at is None:  # nothing was pending: start a new digest period
+                last_sent_at = digest.last_sent_at or now
+                digest.next_due_at = max(now, last_sent_at + delays[digest.user_id])
+                scheduled.append(digest)
+        NotificationDigest.objects.bulk_update(scheduled, ["next_due_at"])
+    return len(delays)
+
+
+@dataclass
+class DigestRunReport:
+    sent: int = 0
+    events: int = 0
+    seconds: float = 0.0
+    complete: bool = True
+
+    def __str__(self):
+        return (f"Sent {self.sent} digests with {self.events} notifications in {self.seconds:.2f}s"
+                + ("" if self.complete else " (time budget exhausted)"))
+
+
+def render_digest(events):
+    by_kind = defaultdict(list)
+    for event in events:
+        by_kind[event.kind].append(event.message)
+    sections = [f"{KINDS.get(kind, kind)}:\n" + "\n".join(f"  - {message}" for message in messages)
+                for kind, messages in by_kind.items()]
+    subject = events[0].message if len(events) == 1 else f"You have {len(events)} new notifications on Sodia"
+    return subject, "\n\n".join(sections)
+
+
+def send_due_digests(chunk_size=100, time_budget=None, connection=None) -> DigestRunReport:
+    report = DigestRunReport()
+    started = time.perf_counter()
+    now = timezone.now()
+    connection = connection or get_connection()
+    while True:
+        if time_budget is not None and time.perf_counter() - started >= time_budget:
+            report.complete = False
+            break
+        digests = list(NotificationDigest.objects.filter(next_due_at__lte=now).select_related("user__login_details")
+                       .order_by("next_due_at")[:chunk_size])
+        if not digests:
+            break
+        events = defaultdict(list)
+        for event in NotificationEvent.objects.filter(
+                user_id__in=[digest.user_id for digest in digests],
+                id__gt=F("user__notification_digest__last_event_id")).order_by("id"):
+            events[event.user_id].append(event)
+
+        messages = []
+        for digest in digests:
+            pending = events.get(digest.user_id)
+            if pending:
+                subject, body = render_digest(pending)
+                messages.append(EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL,
+                                             [digest.user.login_details.email]))
+                digest.last_event_id = pending[-1].id
+                digest.last_sent_at = now
+                report.events += len(pending)
+        if messages:
+            report.sent += connection.send_messages(messages) or 0
+        _settle(digests, now)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _settle(digests, now):
+    """
+    Advances the cursors and clears ``next_due_at``, except for users whose events arrived after the
+    chunk was read: ``notify()`` saw them as scheduled and left them alone, so they are rescheduled.
+    """
+    user_ids = [digest.user_id for digest in digests]
+    with transaction.atomic():
+        list(NotificationDigest.objects.select_for_update().filter(user_id__in=user_ids).values_list("pk"))
+        NotificationDigest.objects.bulk_update(digests, ["last_event_id", "last_sent_at"])
+        arrived = set(NotificationEvent.objects.filter(user_id__in=user_ids,
+                                                       id__gt=F("user__notification_digest__last_event_id"))
+                      .values_list("user_id", flat=True))
+        frequencies = dict(UserNotificationSettings.objects.filter(user_id__in=arrived)
+                           .values_list("user_id", "digest_frequency")) if arrived else {}
+        for digest in digests:
+            delay = DIGEST_DELAYS.get(frequencies.get(digest.user_id))
+            digest.next_due_at = None if delay is None else now + delay
+        NotificationDigest.objects.bulk_update(digests, ["next_due_at"])
@@ -0,0 +1,112 @@
+"""
+Page and fragment caching keyed on who is looking.
+
+Cache keys include ``auth_cache_key(request)``: ``anon`` for signed-out visitors, otherwise the user
+id plus a per-user version that is bumped whenever the user's row or one of their settings rows
+is saved. Versions live in the ``PAGE_VERSION_CACHE`` alias, shared by every worker, so a bump
+retires the user's pages everywhere at once; the pages themselves may stay in a per-process cache,
+where entries for a changed user are never read again and simply age out.
+"""
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpRequest
+
+VERSION_KEY_PREFIX = "page-version:"
+PAGE_KEY_PREFIX = "page:"
+
+
+def version_cache():
+    return caches[getattr(settings, "PAGE_VERSION_CACHE", "default")]
+
+
+def user_version(user_id):
+    return version_cache().get_or_set(f"{VERSION_KEY_PREFIX}{user_id}", 0, None)
+
+
+async def auser_version(user_id):
+    return await version_cache().aget_or_set(f"{VERSION_KEY_PREFIX}{user_id}", 0, None)
+
+
+def bump_user_version(user_id):
+    versions = version_cache()
+    try:
+        versions.incr(f"{VERSION_KEY_PREFIX}{user_id}")
+    except ValueError:
+        versions.set(f"{VERSION_KEY_PREFIX}{user_id}", 1, None)
+
+
+def auth_cache_key(request):
+    """Memoised on ``request.auth``, so a page and its ``{% cache %}`` fragments cost one version read."""
+    auth = getattr(request, "auth", None)
+    if auth is None or auth.user is None:
+        return "anon"
+    if auth.cache_key is None:
+        auth.cache_key = f"{auth.user.pk}:{user_version(auth.user.pk)}"
+    return auth.cache_key
+
+
+async def aauth_cache_key(request):
+    auth = getattr(request, "auth", None)
+    if auth is None or auth.user is None:
+        return "anon"
+    if auth.cache_key is None:
+        auth.cache_key = f"{auth.user.pk}:{await auser_version(auth.user.pk)}"
+    return auth.cache_key
+
+
+def _page_key(request, auth_key):
+    return f"{PAGE_KEY_PREFIX}{request.get_full_path()}:{auth_key}"
+
+
+def _request(args):
+    # plain views get (request, ...), view methods (self, request, ...)
+    return next(arg for arg in args if isinstance(arg, HttpRequest))
+
+
+def _cacheable(request, response):
+    return (request.method in ("GET", "HEAD") and response.status_code == 200
+            and not response.streaming and not response.cookies)
+
+
+def cache_page_by_auth(timeout):
+    """Caches a view's (or a class-based view method's) whole response per path and ``auth_cache_key``."""
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                request = _request(args)
+                # also memoises the key for the context processor, which renders synchronously
+                key = _page_key(request, await aauth_cache_key(request))
+                response = await cache.aget(key)
+                if response is None:
+                    response = await view(*args, **kwargs)
+                    if _cacheable(request, response):
+                        await cache.aset(key, response, timeout)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request = _request(args)
+            key = _page_key(request, auth_cache_key(request))
+            response = cache.get(key)
+            if response is None:
+                response = view(*args, **kwargs)
+                if _cacheable(request, response):
+                    cache.set(key, response, timeout)
+            return response
+        return wrapper
+
+    return decorator
+
+
+def user_row_saved(sender, instance, **kwargs):
+    user_id = getattr(instance, "user_id", instance.pk)
+    bump_user_version(user_id)
+    # again once committed, retiring anything rendered from the old rows in between
+    transaction.on_commit(lambda: bump_user_version(user_id))
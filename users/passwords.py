@@ -3,22 +3,41 @@ import secrets
 import base64
 import os
 
+from django.conf import settings
+
+from Sodia.instrumentation import timed
+from .hashing import get_hashing_service
+
 
 class Password:
+    """
+    A PBKDF2 password hash in ``pbkdf2-<algorithm>:<iterations>:<salt>:<hash>`` form.
+
+    Built from a plain password it is lazy: PBKDF2 only runs when the hash is needed, i.e. when the
+    value is persisted (``str()``) or compared against another ``Password``. The stored algorithm
+    and iteration count act as the parameter version; ``verify()`` upgrades an outdated hash to
+    the current policy (``PASSWORD_HASHING_ALGORITHM`` / ``PASSWORD_HASHING_ITERATIONS``).
+    """
     ALGORITHM = "sha256"
     ITERATIONS = 200000
+    SALT_SIZE = 32
     __slots__ = (
         "algorithm",
         "iterations",
         "salt",
-        "password_hash",
-        "salt_string",
-        "password_hash_string",
+        "_password_hash",
+        "_password",
     )
 
     @staticmethod
     def get_hash(password, algorithm, salt, iterations):
-        return hashlib.pbkdf2_hmac(algorithm, password.encode("utf-8"), salt, iterations)
+        with timed("hash"):
+            return hashlib.pbkdf2_hmac(algorithm, password.encode("utf-8"), salt, iterations)
+
+    @classmethod
+    def policy(cls) -> tuple[str, int]:
+        return (getattr(settings, "PASSWORD_HASHING_ALGORITHM", cls.ALGORITHM),
+                getattr(settings, "PASSWORD_HASHING_ITERATIONS", cls.ITERATIONS))
 
     @classmethod
     def from_password(cls, password: str):
@@ -28,19 +47,23 @@ class Password:
     def from_db_value(cls, value: str):
         return cls(db_string=value)
 
+    @classmethod
+    async def ahash(cls, password: str):
+        """``from_password`` hashed eagerly on the hashing pool; raises ``HashingBusy`` when it is saturated."""
+        return await get_hashing_service().arun(lambda: cls.from_password(password).hash())
+
     def __init__(
             self,
             password: str | None = None, *,
             db_string: str | None = None,
             salt: bytes | None = None,
-            algorithm: str = ALGORITHM,
-            iterations: int = ITERATIONS
+            algorithm: str | None = None,
+            iterations: int | None = None
     ):
+        self._password = None
         if db_string is not None:
             try:
                 algorithm, iterations, salt_string, password_hash_string = db_string.split(":")
-                self.salt_string = salt_string
-                self.password_hash_string = password_hash_string
                 prefix, self.algorithm = algorithm.split("-", 1)
                 if prefix != "pbkdf2":
                     raise ValueError(f"Unsupported algorithm: {algorithm}")
@@ -48,27 +71,69 @@ class Password:
             except ValueError as e:
                 raise ValueError(f"Wrong db string format: {db_string}") from e
             self.salt = base64.b64decode(salt_string)
-            self.password_hash = base64.b64decode(password_hash_string)
+            self._password_hash = base64.b64decode(password_hash_string)
             return
 
-        self.algorithm = algorithm
-        self.iterations = iterations
-        self.salt: bytes = os.urandom(32) if salt is None else salt
         if password is None:
             raise ValueError("Must provide either a password or a db_string")
-        self.password_hash: bytes = self.get_hash(password, self.algorithm, self.salt, self.iterations)
-        self.password_hash_string = base64.b64encode(self.password_hash).decode("ascii")
-        self.salt_string = base64.b64encode(self.salt).decode("ascii")
+        policy_algorithm, policy_iterations = self.policy()
+        self.algorithm = algorithm or policy_algorithm
+        self.iterations = iterations or policy_iterations
+        self.salt: bytes = os.urandom(self.SALT_SIZE) if salt is None else salt
+        self._password_hash = None
+        self._password = password
+
+    @property
+    def is_pending(self) -> bool:
+        """True while the hash has not been computed yet (new or upgraded, and not persisted)."""
+        return self._password is not None
+
+    def hash(self):
+        if self._password is not None:
+            self._password_hash = self.get_hash(self._password, self.algorithm, self.salt, self.iterations)
+            self._password = None
+        return self
+
+    @property
+    def password_hash(self) -> bytes:
+        return self.hash()._password_hash
+
+    @property
+    def password_hash_string(self) -> str:
+        return base64.b64encode(self.password_hash).decode("ascii")
+
+    @property
+    def salt_string(self) -> str:
+        return base64.b64encode(self.salt).decode("ascii")
+
+    def needs_rehash(self) -> bool:
+        return (self.algorithm, self.iterations) != self.policy() or len(self.salt) < self.SALT_SIZE
+
+    def verify(self, password: str, upgrade: bool = True) -> bool:
+        """
+        On success with ``upgrade``, an outdated hash is replaced in place by a pending one under the
+        current policy; ``is_pending`` then tells the caller the new value still has to be saved.
+        """
+        if self._password is not None:
+            return secrets.compare_digest(self._password.encode("utf-8"), password.encode("utf-8"))
+        if not secrets.compare_digest(self._password_hash,
+                                      self.get_hash(password, self.algorithm, self.salt, self.iterations)):
+            return False
+        if upgrade and self.needs_rehash():
+            self.algorithm, self.iterations = self.policy()
+            self.salt = os.urandom(self.SALT_SIZE)
+            self._password_hash = None
+            self._password = password
+        return True
 
-    def verify(self, password: str) -> bool:
-        return secrets.compare_digest(self.password_hash,
-                                      self.get_hash(password, self.algorithm, self.salt, self.iterations))
+    async def averify(self, password: str, upgrade: bool = True) -> bool:
+        return await get_hashing_service().arun(self.verify, password, upgrade)
 
     def __eq__(self, other):
         if isinstance(other, Password):
             return secrets.compare_digest(self.password_hash, other.password_hash)
         if isinstance(other, str):
-            return self.verify(other)
+            return self.verify(other, upgrade=False)
         return NotImplemented
 
     def __str__(self):
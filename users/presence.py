@@ -0,0 +1,152 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import cache
+
+from django.conf import settings
+from django.core.cache import caches
+
+from Sodia.tasks import PeriodicTask
+from .models import User
+from .updates import get_notification_hub
+
+PRESENCE_CHANNEL = "presence"
+WORKERS_KEY = "presence:workers"
+WORKER_KEY_PREFIX = "presence:worker:"
+
+
+class PresenceService:
+    """
+    Who is pressing the Sodia button right now, kept in memory.
+
+    Presses are kept alive by heartbeats and expire ``timeout`` seconds after the last one. Users
+    are kept in heartbeat order, so expiry only ever looks at the oldest entries.
+    ``User.is_pressing_sodia_button`` is only written by ``flush()``, with at most two UPDATEs for
+    everything that changed since the previous flush. Every change is published on the ``presence``
+    hub channel.
+
+    With a ``cache`` shared by all workers, ``sync()`` publishes the ids pressing in this worker
+    there every ``flush_interval`` seconds and reads everyone else's, so counts and partner states
+    cover the whole site, with other workers' presses up to ``flush_interval`` seconds late.
+    """
+    TIMEOUT = 10.0
+    FLUSH_INTERVAL = 5.0
+
+    def __init__(self, timeout=TIMEOUT, flush_interval=FLUSH_INTERVAL, hub=None, cache=None):
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self.hub = hub or get_notification_hub()
+        self.cache = cache
+        self.worker_id = uuid.uuid4().hex
+        self._last_seen: OrderedDict = OrderedDict()  # user id -> monotonic time of the last heartbeat
+        self._remote = frozenset()  # ids pressing in other workers, as of the last sync()
+        self._pressed_since_flush = set()
+        self._released_since_flush = set()
+        self._lock = threading.Lock()
+        self._flusher = PeriodicTask(flush_interval, self.tick, name="presence-flush")
+
+    @classmethod
+    def from_settings(cls):
+        alias = getattr(settings, "SODIA_BUTTON_CACHE", None)
+        return cls(timeout=getattr(settings, "SODIA_BUTTON_TIMEOUT", cls.TIMEOUT),
+                   flush_interval=getattr(settings, "SODIA_BUTTON_FLUSH_INTERVAL", cls.FLUSH_INTERVAL),
+                   cache=caches[alias] if alias else None)
+
+    def press(self, user_id):
+        """Starts a press or extends it (heartbeat)."""
+        with self._lock:
+            is_new = user_id not in self._last_seen
+            self._last_seen[user_id] = time.monotonic()
+            self._last_seen.move_to_end(user_id)
+            if is_new:
+                self._mark(user_id, pressed=True)
+        self._flusher.start()
+        if is_new:
+            self.hub.publish(PRESENCE_CHANNEL)
+
+    heartbeat = press
+
+    def release(self, user_id):
+        with self._lock:
+            released = self._last_seen.pop(user_id, None) is not None
+            if released:
+                self._mark(user_id, pressed=False)
+        if released:
+            self.hub.publish(PRESENCE_CHANNEL)
+
+    def _mark(self, user_id, pressed):
+        (self._released_since_flush if pressed else self._pressed_since_flush).discard(user_id)
+        (self._pressed_since_flush if pressed else self._released_since_flush).add(user_id)
+
+    def expire(self):
+        deadline = time.monotonic() - self.timeout
+        expired = 0
+        with self._lock:
+            while self._last_seen:
+                user_id, last_seen = next(iter(self._last_seen.items()))
+                if last_seen > deadline:
+                    break
+                del self._last_seen[user_id]
+                self._mark(user_id, pressed=False)
+                expired += 1
+        if expired:
+            self.hub.publish(PRESENCE_CHANNEL)
+        return expired
+
+    @property
+    def count(self):
+        return len(self._last_seen.keys() | self._remote)
+
+    def is_pressing(self, user_id):
+        return user_id in self._last_seen or user_id in self._remote
+
+    def state(self, user):
+        """Snapshot for one viewer: the live count and whether their challenge partner is pressing."""
+        self._flusher.start()  # a worker only serving streams still has to sync()
+        return {
+            "count": self.count,
+            "pressing": self.is_pressing(user.pk),
+            "partner_pressing": user.challenge_partner_id is not None and self.is_pressing(user.challenge_partner_id),
+        }
+
+    def flush(self):
+        with self._lock:
+            pressed, self._pressed_since_flush = self._pressed_since_flush, set()
+            released, self._released_since_flush = self._released_since_flush, set()
+        if pressed:
+            User.objects.filter(pk__in=pressed).update(is_pressing_sodia_button=True)
+        if released:
+            User.objects.filter(pk__in=released).update(is_pressing_sodia_button=False)
+        return len(pressed) + len(released)
+
+    def sync(self):
+        """Publishes the ids pressing in this worker to ``cache`` and picks up every other worker's."""
+        if self.cache is None:
+            return
+        with self._lock:
+            mine = list(self._last_seen)
+        # outlives a missed tick or two; a worker that stops syncing drops out when it expires
+        self.cache.set(WORKER_KEY_PREFIX + self.worker_id, mine, self.flush_interval * 3)
+        workers = set(self.cache.get(WORKERS_KEY, ()))
+        others = self.cache.get_many([WORKER_KEY_PREFIX + worker_id for worker_id in workers
+                                      if worker_id != self.worker_id])
+        live = {worker_id for worker_id in workers if WORKER_KEY_PREFIX + worker_id in others} | {self.worker_id}
+        if live != workers:
+            # read-modify-write: a worker dropped by a concurrent sync re-adds itself on its next one
+            self.cache.set(WORKERS_KEY, live, None)
+        remote = frozenset(user_id for user_ids in others.values() for user_id in user_ids)
+        with self._lock:
+            changed, self._remote = remote != self._remote, remote
+        if changed:
+            self.hub.publish(PRESENCE_CHANNEL)
+
+    def tick(self):
+        self.expire()
+        self.flush()
+        self.sync()
+
+
+@cache
+def get_presence_service() -> PresenceService:
+    return PresenceService.from_settings()
@@ -0,0 +1,109 @@
+from django.core.exceptions import ObjectDoesNotExist
+
+from settings.reference import get_reference_data
+from .models import User
+
+# use case -> (select_related relations, only() fields or None for every column); ordered from least to most.
+# Country, House and YearGroup are never joined: they come from settings.reference.
+PROFILE_USE_CASES = {
+    "card": (
+        ("account_settings", "privacy_settings"),
+        ("id", "is_activated", "account_settings__username", "account_settings__first_name",
+         "account_settings__last_name", "account_settings__display_name", "account_settings__is_full_name_hidden",
+         "privacy_settings__full_name", "privacy_settings__profile_picture"),
+    ),
+    "profile": (
+        ("account_settings", "privacy_settings", "challenges_settings"),
+        None,
+    ),
+    "settings": (
+        ("login_details", "account_settings", "privacy_settings", "notification_settings", "challenges_settings"),
+        None,
+    ),
+}
+USE_CASE_ORDER = tuple(PROFILE_USE_CASES)
+
+
+class ProfileBundle:
+    """A ``User`` with its settings relations loaded by one ``User.objects.with_profile()`` query."""
+    __slots__ = ("user", "use_case")
+
+    def __init__(self, user, use_case):
+        self.user = user
+        self.use_case = use_case
+
+    @classmethod
+    def load(cls, user_id, use_case="profile"):
+        return cls(User.objects.with_profile(use_case).get(pk=user_id), use_case)
+
+    @classmethod
+    def load_many(cls, user_ids, use_case="profile") -> dict:
+        """user_id -> bundle, in one query; ids without a user are left out."""
+        return {user.pk: cls(user, use_case) for user in User.objects.with_profile(use_case).filter(pk__in=user_ids)}
+
+    @classmethod
+    def for_request(cls, request, use_case="profile"):
+        """Loads the signed-in user's bundle once per request and memoises it on ``request.auth``."""
+        auth = getattr(request, "auth", None)
+        if auth is None or auth.user is None:
+            return None
+        bundle = auth.profile
+        if bundle is None or not bundle.covers(use_case):
+            bundle = auth.profile = cls.load(auth.user.pk, use_case)
+        return bundle
+
+    def covers(self, use_case):
+        return USE_CASE_ORDER.index(self.use_case) >= USE_CASE_ORDER.index(use_case)
+
+    def _related(self, name):
+        try:
+            return getattr(self.user, name)
+        except ObjectDoesNotExist:
+            return None
+
+    @property
+    def login_details(self):
+        return self._related("login_details")
+
+    @property
+    def account_settings(self):
+        return self._related("account_settings")
+
+    @property
+    def privacy_settings(self):
+        return self._related("privacy_settings")
+
+    @property
+    def notification_settings(self):
+        return self._related("notification_settings")
+
+    @property
+    def challenges_settings(self):
+        return self._related("challenges_settings")
+
+    def _reference(self, table, field):
+        account = self.account_settings
+        return None if account is None else getattr(get_reference_data(), table).get(getattr(account, field))
+
+    @property
+    def country(self):
+        return self._reference("countries", "country_id")
+
+    @property
+    def house(self):
+        return self._reference("houses", "house_id")
+
+    @property
+    def year_group(self):
+        return self._reference("year_groups", "year_group_id")
+
+    @property
+    def display_name(self):
+        account = self.account_settings
+        if account is None:
+            return ""
+        if account.display_name:
+            return account.display_name
+        if account.is_full_name_hidden:
+            return account.username
+        return f"{account.first_name} {account.last_name}"
@@ -0,0 +1,136 @@
+"""
+Indexed profile search.
+
+Every word of a user's username, display name and first/last name is stored normalised (accents
+stripped, case folded) in ``SearchTerm``, and every trigram of those words in ``SearchTrigram``;
+both are rebuilt when ``UserAccountSettings`` is saved. Prefix search is an index range scan per
+query word (``term >= "jo" AND term < "jp"``) grouped by user, fuzzy search counts shared trigrams
+per user. Full-name rows only match when the name is not hidden and ``UserPrivacySettings.full_name``
+lets the viewer see it, checked in the same query.
+"""
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q, Case, When, Value, Max, Count, F
+
+from settings.privacy import visible_q
+from .friends import get_friend_graph
+from .models import SearchTerm, SearchTrigram, SearchSource
+from .profiles import ProfileBundle
+
+SEARCH_FIELDS = {"username", "display_name", "first_name", "last_name"}
+WORD_RE = re.compile(r"[^\W_]+")
+MAX_QUERY_WORDS = 4
+# fuzzy matches must share at least this fraction of the query's trigrams
+SIMILARITY_THRESHOLD = 0.3
+
+
+def normalise(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def words(text):
+    return WORD_RE.findall(normalise(text))
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def account_terms(account):
+    """(source, term) pairs for one ``UserAccountSettings``."""
+    terms = {(SearchSource.USERNAME, word) for word in {normalise(account.username), *words(account.username)}}
+    terms.update((SearchSource.DISPLAY_NAME, word) for word in words(account.display_name))
+    terms.update((SearchSource.FULL_NAME, word) for word in words(f"{account.first_name} {account.last_name}"))
+    max_length = SearchTerm._meta.get_field("term").max_length
+    return {(source, term[:max_length]) for source, term in terms if term}
+
+
+def index_accounts(accounts):
+    """Rebuilds the search rows of every account in ``accounts`` with one delete and insert per table."""
+    accounts = list(accounts)
+    terms, grams = [], set()
+    for account in accounts:
+        for source, term in account_terms(account):
+            terms.append(SearchTerm(user_id=account.user_id, source=source, term=term))
+            grams.update((account.user_id, source, gram) for gram in trigrams(term))
+    user_ids = [account.user_id for account in accounts]
+    with transaction.atomic():
+        SearchTerm.objects.filter(user_id__in=user_ids).delete()
+        SearchTrigram.objects.filter(user_id__in=user_ids).delete()
+        SearchTerm.objects.bulk_create(terms, batch_size=500)
+        SearchTrigram.objects.bulk_create((SearchTrigram(user_id=user_id, source=source, trigram=gram)
+                                           for user_id, source, gram in grams), batch_size=500)
+
+
+def account_settings_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS.intersection(update_fields):
+        index_accounts([instance])
+
+
+def _visible(viewer_id, friends):
+    if viewer_id is not None and friends is None:
+        friends = get_friend_graph().friends(viewer_id)
+    full_name = (Q(user__account_settings__is_full_name_hidden=False)
+                 & visible_q("full_name", viewer_id, friends, prefix="user__privacy_settings__", user_field="user_id"))
+    return ~Q(source=SearchSource.FULL_NAME) | full_name
+
+
+def _successor(word):
+    # the smallest string greater than every string starting with ``word``
+    return word[:-1] + chr(ord(word[-1]) + 1)
+
+
+def prefix_search(query, viewer_id=None, friends=None, limit=10) -> list:
+    """
+    User ids, best first, where every query word is a prefix of one of the user's visible words;
+    exact words rank above prefixes. ``friends`` defaults to the viewer's cached friend set.
+    """
+    query_words = words(query)[:MAX_QUERY_WORDS]
+    if not query_words:
+        return []
+    matches = [Q(term__gte=word, term__lt=_successor(word)) for word in query_words]
+    scores = {f"word_{i}": Max(Case(When(term=word, then=Value(2)), When(match, then=Value(1))))
+              for i, (word, match) in enumerate(zip(query_words, matches))}
+    rows = (SearchTerm.objects.filter(reduce(or_, matches), _visible(viewer_id, friends))
+            .values("user_id").annotate(**scores)
+            .filter(**{f"{name}__isnull": False for name in scores})
+            .annotate(rank=reduce(lambda a, b: a + b, (F(name) for name in scores)))
+            .order_by("-rank", "user_id")[:limit])
+    return [row["user_id"] for row in rows]
+
+
+def fuzzy_search(query, viewer_id=None, friends=None, limit=10) -> list:
+    """User ids ranked by how many of the query's trigrams their visible words share."""
+    grams = set().union(*(trigrams(word) for word in words(query)[:MAX_QUERY_WORDS]))
+    if not grams:
+        return []
+    rows = (SearchTrigram.objects.filter(_visible(viewer_id, friends), trigram__in=grams)
+            .values("user_id").annotate(shared=Count("trigram", distinct=True))
+            .filter(shared__gte=max(2, round(len(grams) * SIMILARITY_THRESHOLD)))
+            .order_by("-shared", "user_id")[:limit])
+    return [row["user_id"] for row in rows]
+
+
+def search(query, viewer_id=None, friends=None, limit=10) -> list:
+    """Prefix matches first, topped up with fuzzy matches when there are fewer than ``limit``."""
+    if viewer_id is not None and friends is None:
+        friends = get_friend_graph().friends(viewer_id)
+    user_ids = prefix_search(query, viewer_id, friends, limit)
+    if len(user_ids) < limit:
+        seen = set(user_ids)
+        user_ids += [user_id for user_id in fuzzy_search(query, viewer_id, friends, limit)
+                     if user_id not in seen][:limit - len(user_ids)]
+    return user_ids
+
+
+def search_profiles(query, viewer_id=None, friends=None, limit=10) -> list[ProfileBundle]:
+    """``search()`` results as "card" bundles, in rank order."""
+    user_ids = search(query, viewer_id, friends, limit)
+    bundles = ProfileBundle.load_many(user_ids, "card")
+    return [bundles[user_id] for user_id in user_ids if user_id in bundles]
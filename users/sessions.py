@@ -0,0 +1,295 @@
+import atexit
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from Sodia.instrumentation import timed, record
+from Sodia.tasks import PeriodicTask
+from .models import Session
+
+
+class SessionToucher:
+    """
+    Slides ``Session.expires_at`` and ``last_request_at`` forward, but only once ``threshold`` has
+    passed since the last touch (or the client IP changed), and only writes the touched columns.
+
+    In buffered mode touches are kept in memory and written with one ``bulk_update`` on a timer
+    and at interpreter shutdown, so a burst of page views costs at most one write per session.
+    """
+    TOUCH_FIELDS = ("last_request_ip", "last_request_at", "expires_at")
+    THRESHOLD = timedelta(minutes=5)
+    FLUSH_INTERVAL = 30
+    BATCH_SIZE = 500
+
+    def __init__(self, threshold=THRESHOLD, buffered=False, flush_interval=FLUSH_INTERVAL):
+        self.threshold = threshold
+        self.buffered = buffered
+        self._pending: dict[int, Session] = {}
+        self._lock = threading.Lock()
+        self._flusher = PeriodicTask(flush_interval, self.flush, name="session-touch-flush") if buffered else None
+        if buffered:
+            atexit.register(self.flush)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            threshold=timedelta(seconds=getattr(settings, "SESSION_TOUCH_THRESHOLD", cls.THRESHOLD.total_seconds())),
+            buffered=getattr(settings, "SESSION_TOUCH_BUFFERED", False),
+            flush_interval=getattr(settings, "SESSION_TOUCH_FLUSH_INTERVAL", cls.FLUSH_INTERVAL),
+        )
+
+    def needs_touch(self, session, ip, now=None):
+        now = now or timezone.now()
+        return session.last_request_ip != ip or now - session.last_request_at >= self.threshold
+
+    def touch(self, session, ip):
+        """Returns True if the session was (or will be, when buffered) written."""
+        if not self._slide(session, ip):
+            return False
+        if not self.buffered:
+            # update() rather than save(): only the touched columns, and auto_now is not re-applied
+            with timed("session_write"):
+                Session.objects.filter(pk=session.pk).update(**self._touched_values(session))
+        return True
+
+    async def atouch(self, session, ip):
+        if not self._slide(session, ip):
+            return False
+        if not self.buffered:
+            with timed("session_write"):
+                await Session.objects.filter(pk=session.pk).aupdate(**self._touched_values(session))
+        return True
+
+    def _slide(self, session, ip):
+        now = timezone.now()
+        if not self.needs_touch(session, ip, now):
+            return False
+        session.last_request_ip = ip
+        session.last_request_at = now
+        session.expires_at = now + Session.objects.DEFAULT_TTL
+        if self.buffered:
+            self._buffer(session)
+            record("session_buffered")
+        return True
+
+    def _touched_values(self, session):
+        return {f: getattr(session, f) for f in self.TOUCH_FIELDS}
+
+    def _buffer(self, session):
+        # keep a detached copy so a later flush never writes whatever the request did to the instance
+        pending = Session(pk=session.pk, token=session.token, **self._touched_values(session))
+        with self._lock:
+            self._pending[session.pk] = pending
+        self._flusher.start()
+
+    def discard(self, session_pk):
+        with self._lock:
+            self._pending.pop(session_pk, None)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        # rows deleted in the meantime are simply not matched by the UPDATE
+        Session.objects.bulk_update(pending.values(), self.TOUCH_FIELDS, batch_size=self.BATCH_SIZE)
+        return len(pending)
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+
+class SessionCache:
+    """
+    token -> Session (with ``user`` already joined) resolution cache.
+
+    The first level is an in-process LRU, the optional second level is a shared Django cache
+    (``SESSION_CACHE_BACKEND`` names an alias in ``CACHES``). Entries never outlive
+    ``Session.expires_at``; other processes' LRUs are bounded by the short ``local_ttl``.
+    Every caller gets its own copy of the session and its user, so nothing a request sets on them
+    leaks into other requests.
+    """
+    MAX_SIZE = 10000
+    LOCAL_TTL = 30
+    SHARED_TTL = 300
+    KEY_PREFIX = "session:"
+
+    def __init__(self, max_size=MAX_SIZE, local_ttl=LOCAL_TTL, backend=None, shared_ttl=SHARED_TTL):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.backend = backend
+        self.shared_ttl = shared_ttl
+        self._entries: OrderedDict[str, tuple[Session, float]] = OrderedDict()
+        self._tokens_by_user: dict = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        alias = getattr(settings, "SESSION_CACHE_BACKEND", None)
+        return cls(
+            max_size=getattr(settings, "SESSION_CACHE_SIZE", cls.MAX_SIZE),
+            local_ttl=getattr(settings, "SESSION_CACHE_TTL", cls.LOCAL_TTL),
+            backend=caches[alias] if alias else None,
+        )
+
+    def _key(self, token):
+        return self.KEY_PREFIX + token
+
+    @staticmethod
+    def _seconds_left(session):
+        return (session.expires_at - timezone.now()).total_seconds()
+
+    def resolve(self, token) -> Session | None:
+        """Same contract as ``Session.objects.select_related("user").get(token=token)``, but None if missing."""
+        session = self.get(token)
+        if session is not None:
+            return session
+        try:
+            session = Session.objects.select_related("user").get(token=token)
+        except Session.DoesNotExist:
+            return None
+        if session.is_valid():
+            self.set(session)
+        return session
+
+    async def aresolve(self, token) -> Session | None:
+        session = await self.aget(token)
+        if session is not None:
+            return session
+        try:
+            session = await Session.objects.select_related("user").aget(token=token)
+        except Session.DoesNotExist:
+            return None
+        if session.is_valid():
+            await self.aset(session)
+        return session
+
+    def get(self, token) -> Session | None:
+        session = self._get_local(token)
+        if session is not None or self.backend is None:
+            return session
+        return self._store_shared(self.backend.get(self._key(token)))
+
+    async def aget(self, token) -> Session | None:
+        session = self._get_local(token)
+        if session is not None or self.backend is None:
+            return session
+        return self._store_shared(await self.backend.aget(self._key(token)))
+
+    def _get_local(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                session, deadline = entry
+                if deadline > time.monotonic() and session.is_valid():
+                    self._entries.move_to_end(token)
+                    return self._copy(session)
+                self._pop(token)
+        return None
+
+    @staticmethod
+    def _copy(session):
+        session = copy.copy(session)  # Model.__getstate__ gives the copy its own related-object cache
+        if Session.user.is_cached(session):
+            session.user = copy.copy(session.user)
+        return session
+
+    def _store_shared(self, session):
+        if session is None or not session.is_valid():
+            return None
+        self._store(session)
+        return session
+
+    def set(self, session):
+        seconds_left = self._seconds_left(session)
+        if seconds_left <= 0:
+            return
+        self._store(session)
+        if self.backend is not None:
+            self.backend.set(self._key(session.token), session, min(self.shared_ttl, seconds_left))
+
+    async def aset(self, session):
+        seconds_left = self._seconds_left(session)
+        if seconds_left <= 0:
+            return
+        self._store(session)
+        if self.backend is not None:
+            await self.backend.aset(self._key(session.token), session, min(self.shared_ttl, seconds_left))
+
+    def _store(self, session):
+        deadline = time.monotonic() + min(self.local_ttl, self._seconds_left(session))
+        with self._lock:
+            self._pop(session.token)
+            self._entries[session.token] = (self._copy(session), deadline)
+            self._tokens_by_user.setdefault(session.user_id, set()).add(session.token)
+            while len(self._entries) > self.max_size:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(entry[0].user_id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[entry[0].user_id]
+        return entry
+
+    def invalidate(self, token):
+        with self._lock:
+            self._pop(token)
+        if self.backend is not None:
+            self.backend.delete(self._key(token))
+
+    def invalidate_session(self, session):
+        """Drops every token cached for this session row, including ones it was rotated away from."""
+        with self._lock:
+            tokens = [token for token in self._tokens_by_user.get(session.user_id, ())
+                      if self._entries[token][0].pk == session.pk]
+        for token in {*tokens, session.token}:
+            self.invalidate(token)
+
+    def invalidate_user(self, user_id):
+        """Drops this process's entries for the user; shared entries age out after ``shared_ttl``."""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._pop(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@cache
+def get_session_cache() -> SessionCache:
+    return SessionCache.from_settings()
+
+
+def session_saved(sender, instance, **kwargs):
+    get_session_cache().invalidate_session(instance)
+
+
+def session_deleted(sender, instance, **kwargs):
+    get_session_toucher().discard(instance.pk)
+    get_session_cache().invalidate(instance.token)
+
+
+def user_saved(sender, instance, **kwargs):
+    get_session_cache().invalidate_user(instance.pk)
+
+
+@cache
+def get_session_toucher() -> SessionToucher:
+    return SessionToucher.from_settings()
@@ -1,3 +1,440 @@
-from django.test import TestCase
+import itertools
+import random
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.test import Client, RequestFactory, TestCase, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from Sodia.storage import CompressedManifestStaticFilesStorage
+from .gc import collect_garbage
+from .hashing import HashingService
+from .matching import FeatureMatrix, MatchingEngine
+from .models import (User, UserLoginDetails, Session, SessionUpdate, NotificationDigest, Friendship,
+                     FriendshipStatus)
+from .notifications import notify, send_due_digests
+from .page_cache import auser_version, user_version
+from .passwords import Password
+from .presence import PRESENCE_CHANNEL, PresenceService
+from .sessions import SessionToucher, get_session_cache
+from .throttling import LoginAdmission, LoginThrottled, authenticate
+from .updates import enqueue_updates
+from .views import UpdateStream
+
+
+def create_user(email="ada@example.com", password="correct horse"):
+    return User.objects.create_user(first_name="Ada", last_name="Lovelace", email=email, password=password)
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class PasswordTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+
+    def stored(self):
+        return str(UserLoginDetails.objects.values_list("password", flat=True).get(pk=self.user.pk))
+
+    def test_password_is_stored_hashed(self):
+        stored = self.stored()
+        self.assertTrue(stored.startswith("pbkdf2-sha256:1000:"))
+        self.assertNotIn("correct horse", stored)
+
+    def test_hashing_is_lazy(self):
+        password = Password.from_password("secret")
+        self.assertTrue(password.is_pending)
+        self.assertTrue(password.verify("secret"))
+        self.assertFalse(password.verify("wrong"))
+
+    def test_check_password_upgrades_outdated_hash(self):
+        old = self.stored()
+        with override_settings(PASSWORD_HASHING_ITERATIONS=2000):
+            details = UserLoginDetails.objects.get(pk=self.user.pk)
+            self.assertTrue(details.check_password("correct horse"))
+            upgraded = self.stored()
+            self.assertTrue(upgraded.startswith("pbkdf2-sha256:2000:"))
+            self.assertNotEqual(old, upgraded)
+            self.assertTrue(UserLoginDetails.objects.get(pk=self.user.pk).check_password("correct horse"))
+        self.assertEqual(self.stored(), upgraded)
+
+    def test_wrong_password_does_not_upgrade(self):
+        old = self.stored()
+        with override_settings(PASSWORD_HASHING_ITERATIONS=2000):
+            self.assertFalse(UserLoginDetails.objects.get(pk=self.user.pk).check_password("wrong"))
+        self.assertEqual(self.stored(), old)
+
+    def test_current_hash_is_not_rewritten(self):
+        old = self.stored()
+        self.assertTrue(UserLoginDetails.objects.get(pk=self.user.pk).check_password("correct horse"))
+        self.assertEqual(self.stored(), old)
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class AuthenticateTests(TestCase):
+    def setUp(self):
+        self.user = create_user(" Ada@Example.com")
+        self.request = RequestFactory().post("/login")
+        admission = LoginAdmission(LocMemCache(self.id(), {}), email_limit=(2, 60))
+        patcher = mock.patch("users.throttling.get_login_admission", return_value=admission)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_email_is_stored_normalised(self):
+        self.assertEqual(UserLoginDetails.objects.get(pk=self.user.pk).email, "ada@example.com")
+        with self.assertRaises(IntegrityError):
+            create_user("ADA@example.com")
+
+    def test_login_ignores_email_case(self):
+        self.assertEqual(authenticate(self.request, "ADA@example.COM ", "correct horse").user, self.user)
+        self.assertIsNone(authenticate(self.request, "ada@example.com", "wrong"))
+
+    def test_throttled_attempt_does_not_hash(self):
+        authenticate(self.request, "ada@example.com", "wrong")
+        authenticate(self.request, "Ada@example.com", "wrong")
+        with mock.patch.object(Password, "verify") as verify, self.assertRaises(LoginThrottled):
+            authenticate(self.request, "ada@example.com", "correct horse")
+        verify.assert_not_called()
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class SessionCacheTests(TestCase):
+    def setUp(self):
+        self.cache = get_session_cache()
+        self.cache.clear()
+        self.addCleanup(self.cache.clear)
+        self.user = create_user()
+        self.session = Session.objects.create(user=self.user, last_request_ip="127.0.0.1")
+
+    def test_resolve_caches_session(self):
+        self.assertEqual(self.cache.resolve(self.session.token).pk, self.session.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.resolve(self.session.token).pk, self.session.pk)
+
+    def test_each_caller_gets_its_own_copy(self):
+        first = self.cache.resolve(self.session.token)
+        first.last_request_ip = "10.0.0.1"
+        first.user.challenge_streak = 7
+        second = self.cache.resolve(self.session.token)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.last_request_ip, "127.0.0.1")
+        self.assertEqual(second.user.challenge_streak, 0)
+
+    def test_unknown_token(self):
+        self.assertIsNone(self.cache.resolve("missing"))
+
+    def test_rotate_token_invalidates_old_token(self):
+        old_token = self.session.token
+        self.cache.resolve(old_token)
+        new_token = self.session.rotate_token()
+        self.assertIsNone(self.cache.get(old_token))
+        self.assertIsNone(self.cache.resolve(old_token))
+        self.assertEqual(self.cache.resolve(new_token).pk, self.session.pk)
+
+    def test_delete_invalidates(self):
+        self.cache.resolve(self.session.token)
+        self.session.delete()
+        self.assertIsNone(self.cache.resolve(self.session.token))
+
+    def test_save_invalidates(self):
+        self.cache.resolve(self.session.token)
+        self.session.last_request_ip = "10.0.0.1"
+        self.session.save()
+        self.assertIsNone(self.cache.get(self.session.token))
+        self.assertEqual(self.cache.resolve(self.session.token).last_request_ip, "10.0.0.1")
+
+    def test_user_save_invalidates(self):
+        self.cache.resolve(self.session.token)
+        self.user.save()
+        self.assertIsNone(self.cache.get(self.session.token))
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class SessionToucherTests(TestCase):
+    def setUp(self):
+        self.session = Session.objects.create(user=create_user(), last_request_ip="127.0.0.1")
+
+    def make_stale(self):
+        self.session.last_request_at -= SessionToucher.THRESHOLD
+        Session.objects.filter(pk=self.session.pk).update(last_request_at=self.session.last_request_at)
+
+    def test_no_write_inside_threshold(self):
+        with self.assertNumQueries(0):
+            self.assertFalse(SessionToucher().touch(self.session, "127.0.0.1"))
+
+    def test_ip_change_is_written(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(SessionToucher().touch(self.session, "10.0.0.1"))
+        self.assertEqual(Session.objects.get(pk=self.session.pk).last_request_ip, "10.0.0.1")
+
+    def test_only_touched_columns_are_written(self):
+        self.make_stale()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(SessionToucher().touch(self.session, "127.0.0.1"))
+        [query] = queries.captured_queries
+        set_clause = query["sql"].split(" SET ", 1)[1].split(" WHERE ", 1)[0]
+        self.assertEqual(sorted(column.split("=")[0].strip(' "') for column in set_clause.split(", ")),
+                         sorted(SessionToucher.TOUCH_FIELDS))
+        stored = Session.objects.get(pk=self.session.pk)
+        self.assertEqual(stored.expires_at, self.session.expires_at)
+        self.assertEqual(stored.last_request_at, self.session.last_request_at)
+
+    def test_buffered_touches_are_flushed_together(self):
+        toucher = SessionToucher(buffered=True, flush_interval=3600)
+        self.addCleanup(toucher._flusher.stop)
+        self.make_stale()
+        other = Session.objects.create(user=self.session.user, last_request_ip="127.0.0.1")
+        with self.assertNumQueries(0):
+            self.assertTrue(toucher.touch(self.session, "127.0.0.1"))
+            self.assertTrue(toucher.touch(other, "10.0.0.1"))
+            self.assertFalse(toucher.touch(self.session, "127.0.0.1"))
+        self.assertEqual(toucher.pending_count, 2)
+        self.assertEqual(toucher.flush(), 2)
+        self.assertEqual(toucher.pending_count, 0)
+        self.assertEqual(Session.objects.get(pk=self.session.pk).expires_at, self.session.expires_at)
+        self.assertEqual(Session.objects.get(pk=other.pk).last_request_ip, "10.0.0.1")
+        with self.assertNumQueries(0):
+            self.assertEqual(toucher.flush(), 0)
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class UpdateNumberTests(TestCase):
+    def test_numbers_are_allocated_in_sequence(self):
+        user = create_user()
+        sessions = [Session.objects.create(user=user, last_request_ip="127.0.0.1") for _ in range(2)]
+        self.assertEqual(enqueue_updates(sessions, "one"), 2)
+        self.assertEqual(enqueue_updates(sessions[:1], "two"), 1)
+        self.assertEqual(list(SessionUpdate.objects.filter(session=sessions[0]).order_by("update_number")
+                              .values_list("update_number", "update_message")), [(0, "one"), (1, "two")])
+        self.assertEqual(Session.objects.get(pk=sessions[0].pk).next_update_number, 2)
+        self.assertEqual(Session.objects.get(pk=sessions[1].pk).next_update_number, 1)
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class GarbageCollectionTests(TestCase):
+    def setUp(self):
+        user = create_user()
+        self.live = Session.objects.create(user=user, last_request_ip="127.0.0.1")
+        self.expired = [Session.objects.create(user=user, last_request_ip="127.0.0.1",
+                                               expires_at=timezone.now() - timedelta(minutes=1)) for _ in range(5)]
+        enqueue_updates([self.live, *self.expired], "one")
+        enqueue_updates([self.live], "two")
+        enqueue_updates([self.live], "three")
+        Session.objects.filter(pk=self.live.pk).update(acknowledged_update_number=1)
+
+    def test_deletes_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            report = collect_garbage(chunk_size=2)
+        self.assertTrue(report.complete)
+        self.assertEqual((report.sessions, report.updates), (5, 5 + 2))
+        self.assertEqual(list(Session.objects.values_list("pk", flat=True)), [self.live.pk])
+        self.assertEqual(sum(query["sql"].startswith('DELETE FROM "users_session"')
+                             for query in queries.captured_queries), 3)
+
+    def test_keeps_unacknowledged_updates_of_live_sessions(self):
+        collect_garbage()
+        self.assertEqual(list(SessionUpdate.objects.values_list("session_id", "update_message")),
+                         [(self.live.pk, "three")])
+
+    def test_stops_when_time_budget_runs_out(self):
+        # every clock reading advances one second, so only the first chunk fits in the budget
+        with mock.patch("users.gc.time.perf_counter", side_effect=itertools.count()):
+            report = collect_garbage(chunk_size=2, time_budget=1.5)
+        self.assertFalse(report.complete)
+        self.assertEqual(report.sessions, 2)
+        self.assertEqual(Session.objects.count(), 4)
+        self.assertEqual(collect_garbage().sessions, 3)
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class UpdateStreamTests(TestCase):
+    @mock.patch.object(UpdateStream, "KEEPALIVE", 0.01)
+    async def test_stream_ends_once_session_is_deleted(self):
+        user = await sync_to_async(create_user)()
+        session = await Session.objects.acreate(user=user, last_request_ip="127.0.0.1")
+        stream = UpdateStream().stream(session, -1)
+        self.assertEqual(await anext(stream), ": keepalive\n\n")
+        await Session.objects.filter(pk=session.pk).adelete()
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class SodiaButtonTests(TestCase):
+    def setUp(self):
+        session = Session.objects.create(user=create_user(), last_request_ip="127.0.0.1")
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.cookies["auth"] = session.token
+
+    def test_page_hosting_the_button_sets_csrf_cookie(self):
+        self.assertEqual(self.client.post("/sodia-button", {"action": "release"}).status_code, 403)
+        for _ in range(2):  # the second response comes from the page cache
+            self.assertEqual(self.client.get("/auth").status_code, 200)
+            self.assertIn(settings.CSRF_COOKIE_NAME, self.client.cookies)
+        response = self.client.post("/sodia-button", {"action": "release"},
+                                    headers={"X-CSRFToken": self.client.cookies[settings.CSRF_COOKIE_NAME].value})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["pressing"])
+
+
+class PresenceTests(SimpleTestCase):
+    def setUp(self):
+        cache = LocMemCache("presence-tests", {})
+        self.workers = [PresenceService(flush_interval=3600, hub=mock.Mock(), cache=cache) for _ in range(2)]
+        for worker in self.workers:
+            self.addCleanup(worker._flusher.stop)
+
+    def sync(self):
+        # twice: a worker only finds the ones that registered before it in the first round
+        for worker in self.workers * 2:
+            worker.sync()
+
+    def test_presses_are_shared_between_workers(self):
+        first, second = self.workers
+        user_id, partner_id = uuid.uuid4(), uuid.uuid4()
+        first.press(user_id)
+        second.press(partner_id)
+        self.assertEqual((first.count, second.count), (1, 1))
+        self.sync()
+        self.assertEqual((first.count, second.count), (2, 2))
+        self.assertTrue(second.is_pressing(user_id))
+        second.hub.publish.assert_called_with(PRESENCE_CHANNEL)
+        first.release(user_id)
+        self.sync()
+        self.assertFalse(second.is_pressing(user_id))
+        self.assertEqual(second.count, 1)
+
+
+class HashingServiceTests(SimpleTestCase):
+    def test_map_waits_for_a_slot(self):
+        service = HashingService(max_workers=1, max_queue=0, queue_timeout=0.01)
+        self.addCleanup(service.shutdown)
+        release = threading.Event()
+        busy = service.submit(release.wait)
+        threading.Timer(0.1, release.set).start()
+        self.assertEqual(list(service.map(lambda x: x * 2, [1, 2, 3])), [2, 4, 6])
+        self.assertTrue(busy.result())
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class CreateUsersTests(TestCase):
+    def test_hashing_failure_is_reported_per_row(self):
+        rows = [
+            {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com", "password": "secret"},
+            {"first_name": "Bad", "last_name": "Row", "email": "bad@example.com", "password": 12345},
+        ]
+        result = User.objects.create_users(rows)
+        self.assertEqual(len(result.created), 1)
+        self.assertEqual([index for index, _, _ in result.failures], [1])
+        self.assertTrue(UserLoginDetails.objects.get(email="ada@example.com").check_password("secret"))
+
+
+class MatchingTests(SimpleTestCase):
+    def test_pairing_is_stable(self):
+        rng = random.Random(1)
+        rows = [(uuid.UUID(int=i), 2, rng.choice([1, 2, 4, 7, 7]), rng.random(), rng.random(),
+                 rng.choice(["m", "f", "x"]), rng.randint(7, 13), rng.randint(1, 8), rng.choice([1, 2, 4, None]),
+                 rng.randint(1, 30), None) for i in range(300)]
+        features = FeatureMatrix(rows)
+        pairing = MatchingEngine(features).match_all()
+        everyone = list(range(len(features)))
+        scores = features.scores(*(np.array(everyone),) * 2)
+        current = [scores[i, features.index[pairing[user_id]]] if pairing[user_id] else -np.inf
+                   for i, user_id in enumerate(features.ids)]
+        for i in everyone:
+            for j in everyone[i + 1:]:
+                self.assertFalse(scores[i, j] > current[i] and scores[i, j] > current[j],
+                                 f"{i} and {j} would both rather be paired with each other")
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class DigestTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+
+    def make_due(self):
+        NotificationDigest.objects.filter(user=self.user).update(next_due_at=timezone.now())
+
+    def test_digest_is_sent_once(self):
+        notify([self.user.pk], "new_friend_requests", "first")
+        self.make_due()
+        self.assertEqual(send_due_digests().sent, 1)
+        self.assertEqual(send_due_digests().sent, 0)
+        self.assertIsNone(NotificationDigest.objects.get(user=self.user).next_due_at)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_event_arriving_during_a_run_stays_scheduled(self):
+        notify([self.user.pk], "new_friend_requests", "first")
+        self.make_due()
+        user_id = self.user.pk
+
+        class Connection:
+            def send_messages(self, messages):
+                # committed after the run read its events, while the digest still looked scheduled
+                notify([user_id], "new_friend_requests", "second")
+                return len(messages)
+
+        self.assertEqual(send_due_digests(connection=Connection()).sent, 1)
+        self.assertIsNotNone(NotificationDigest.objects.get(user=self.user).next_due_at)
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class PageVersionTests(TestCase):
+    def test_settings_save_bumps_version(self):
+        user = create_user()
+        before = user_version(user.pk)
+        user.account_settings.display_name = "Countess"
+        user.account_settings.save()
+        self.assertGreater(user_version(user.pk), before)
+
+    def test_async_page_reads_version_once_without_blocking(self):
+        session = Session.objects.create(user=create_user(), last_request_ip="127.0.0.1")
+        self.client.cookies["auth"] = session.token
+        # the blocking read would raise SynchronousOnlyOperation in the event loop with a database cache
+        with mock.patch("users.page_cache.user_version", side_effect=AssertionError("blocking version read")), \
+                mock.patch("users.page_cache.auser_version", wraps=auser_version) as version:
+            self.assertContains(self.client.get("/auth"), "navigation bar")
+        version.assert_called_once_with(session.user_id)
+
+
+class StaticFilesTests(TestCase):
+    def test_pages_render_without_collectstatic(self):
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "/static/main.css")
+
+    def test_missing_manifest_entry_fails_outside_debug(self):
+        with tempfile.TemporaryDirectory() as location:
+            storage = CompressedManifestStaticFilesStorage(location=location)
+            with self.assertRaises(ValueError):
+                storage.url("main.css")
+            with override_settings(DEBUG=True):
+                self.assertEqual(storage.url("main.css"), "/static/main.css")
+
+
+@override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+class FriendshipTests(TestCase):
+    def setUp(self):
+        self.a, self.b = create_user("a@example.com"), create_user("b@example.com")
+
+    def test_reverse_row_is_rejected(self):
+        Friendship.objects.create(from_user=self.a, to_user=self.b)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Friendship.objects.create(from_user=self.b, to_user=self.a)
+
+    def test_crossed_requests_accept(self):
+        Friendship.objects.request(self.a.pk, self.b.pk)
+        # as if b's request had checked for a row before a's insert was committed
+        with mock.patch.object(QuerySet, "first", return_value=None):
+            friendship = Friendship.objects.request(self.b.pk, self.a.pk)
+        self.assertEqual(friendship.status, FriendshipStatus.ACCEPTED)
+        self.assertEqual(Friendship.objects.count(), 1)
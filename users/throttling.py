@@ -0,0 +1,155 @@
+"""
+Admission control in front of password verification.
+
+Every attempt first takes a token from a per-IP and a per-email bucket (kept in the
+``LOGIN_THROTTLE_CACHE`` alias, which must be shared so all workers see the same buckets) and then a slot from a cap on concurrent hashes in this
+process. Anything refused raises ``LoginThrottled`` before PBKDF2 runs, so a flood of attempts
+costs a couple of cache round trips each instead of a full hash.
+"""
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from functools import cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .hashing import get_hashing_service
+from .middleware import get_client_ip
+from .models import User, UserLoginDetails
+from .passwords import Password
+
+logger = logging.getLogger(__name__)
+
+class LoginThrottled(Exception):
+    def __init__(self, reason, retry_after=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    ``capacity`` attempts, refilled at ``capacity`` per ``period`` seconds. The read-modify-write on
+    the cache is not atomic, so concurrent workers can occasionally let one extra attempt through.
+    """
+
+    def __init__(self, cache, prefix, capacity, period):
+        self.cache = cache
+        self.prefix = prefix
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.period = period
+
+    def take(self, key) -> float | None:
+        """None if a token was taken, otherwise the seconds until one is available."""
+        cache_key = f"{self.prefix}:{key}"
+        now = time.time()
+        tokens, retry_after = self._refill(self.cache.get(cache_key), now)
+        if retry_after is None:
+            self.cache.set(cache_key, (tokens - 1, now), self.period)
+        return retry_after
+
+    async def atake(self, key) -> float | None:
+        cache_key = f"{self.prefix}:{key}"
+        now = time.time()
+        tokens, retry_after = self._refill(await self.cache.aget(cache_key), now)
+        if retry_after is None:
+            await self.cache.aset(cache_key, (tokens - 1, now), self.period)
+        return retry_after
+
+    def _refill(self, state, now):
+        tokens, updated = state or (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        return tokens, None if tokens >= 1 else (1 - tokens) / self.rate
+
+
+class LoginAdmission:
+    IP_LIMIT = (20, 60)  # attempts, per seconds
+    EMAIL_LIMIT = (5, 60)
+
+    def __init__(self, cache, ip_limit=IP_LIMIT, email_limit=EMAIL_LIMIT, max_concurrent_hashes=None):
+        self.ip_bucket = TokenBucket(cache, "login-throttle:ip", *ip_limit)
+        self.email_bucket = TokenBucket(cache, "login-throttle:email", *email_limit)
+        self.max_concurrent_hashes = max_concurrent_hashes or os.cpu_count() or 1
+        self._hash_slots = threading.BoundedSemaphore(self.max_concurrent_hashes)
+
+    @classmethod
+    def from_settings(cls):
+        alias = getattr(settings, "LOGIN_THROTTLE_CACHE", "default")
+        if isinstance(caches[alias], LocMemCache):
+            logger.warning("LOGIN_THROTTLE_CACHE %r is local to each process: with N workers the login limits "
+                           "are N times what LOGIN_THROTTLE_IP / LOGIN_THROTTLE_EMAIL say", alias)
+        return cls(
+            caches[alias],
+            ip_limit=getattr(settings, "LOGIN_THROTTLE_IP", cls.IP_LIMIT),
+            email_limit=getattr(settings, "LOGIN_THROTTLE_EMAIL", cls.EMAIL_LIMIT),
+            max_concurrent_hashes=getattr(settings, "LOGIN_MAX_CONCURRENT_HASHES", None),
+        )
+
+    @staticmethod
+    def _raise_if_limited(ip_retry_after, email_retry_after):
+        if ip_retry_after is not None:
+            raise LoginThrottled("Too many login attempts from this address", ip_retry_after)
+        if email_retry_after is not None:
+            raise LoginThrottled("Too many login attempts for this account", email_retry_after)
+
+    @contextmanager
+    def _hash_slot(self):
+        if not self._hash_slots.acquire(blocking=False):
+            raise LoginThrottled("Too many logins in progress, try again shortly", 1)
+        try:
+            yield
+        finally:
+            self._hash_slots.release()
+
+    @contextmanager
+    def admit(self, request, email):
+        self._raise_if_limited(self.ip_bucket.take(get_client_ip(request)),
+                               self.email_bucket.take(User.objects.normalize_email(email)))
+        with self._hash_slot():
+            yield
+
+    @asynccontextmanager
+    async def aadmit(self, request, email):
+        self._raise_if_limited(await self.ip_bucket.atake(get_client_ip(request)),
+                               await self.email_bucket.atake(User.objects.normalize_email(email)))
+        with self._hash_slot():
+            yield
+
+
+@cache
+def get_login_admission() -> LoginAdmission:
+    return LoginAdmission.from_settings()
+
+
+@cache
+def unknown_email_password() -> Password:
+    """Verified against for unknown emails, so they take as long as wrong passwords."""
+    return Password.from_password(secrets.token_urlsafe(32)).hash()
+
+
+def authenticate(request, email, password) -> UserLoginDetails | None:
+    """Raises ``LoginThrottled`` without hashing when the attempt is not admitted."""
+    email = User.objects.normalize_email(email)
+    with get_login_admission().admit(request, email):
+        details = UserLoginDetails.objects.select_related("user").filter(email=email).first()
+        if details is None:
+            unknown_email_password().verify(password)
+            return None
+        return details if details.check_password(password) else None
+
+
+async def aauthenticate(request, email, password) -> UserLoginDetails | None:
+    email = User.objects.normalize_email(email)
+    async with get_login_admission().aadmit(request, email):
+        details = await UserLoginDetails.objects.select_related("user").filter(email=email).afirst()
+        if details is None:
+            dummy = await get_hashing_service().arun(unknown_email_password)
+            await dummy.averify(password)
+            return None
+        return details if await details.acheck_password(password) else None
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+from collections import defaultdict
+from functools import cache
+
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+
+from .models import Session, SessionUpdate
+
+CHUNK_SIZE = 500
+
+
+class Subscription:
+    """One waiter on a hub channel; ``publish`` may be called from any thread."""
+    __slots__ = ("hub", "channel", "loop", "event")
+
+    def __init__(self, hub, channel):
+        self.hub = hub
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def notify(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:  # the subscriber's loop is already closed
+            pass
+
+    def clear(self):
+        self.event.clear()
+
+    async def wait(self, timeout=None) -> bool:
+        """True if the channel was published to (since the last clear()), False on timeout."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def __enter__(self):
+        self.hub._add(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.hub._remove(self)
+
+
+class NotificationHub:
+    """
+    In-process pub/sub: streaming responses subscribe to a channel and sleep until a producer
+    publishes to it, instead of polling the database. A waiter costs one ``asyncio.Event``, so a
+    worker can hold as many open streams as it has connections.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel) -> Subscription:
+        return Subscription(self, channel)
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.channel].add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, *channels):
+        with self._lock:
+            subscriptions = [s for channel in channels for s in self._subscriptions.get(channel, ())]
+        for subscription in subscriptions:
+            subscription.notify()
+
+    def publish_on_commit(self, *channels):
+        transaction.on_commit(lambda: self.publish(*channels))
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscriptions.get(channel, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+@cache
+def get_notification_hub() -> NotificationHub:
+    return NotificationHub()
+
+
+def session_channel(session_id):
+    return f"session:{session_id}"
+
+
+def enqueue_updates(sessions, message) -> int:
+    """
+    Appends ``message`` to the update queue of every session in ``sessions`` (Session objects,
+    pks or a queryset) and wakes their streams once the transaction commits.
+
+    Numbers are allocated with ``next_update_number = next_update_number + 1`` on a whole chunk
+    at once; the row locks taken by that UPDATE serialise concurrent producers, so reading the
+    new values back in the same transaction can never hand out a number twice and producers never
+    retry on ``unique_session_update_number``. Each chunk costs three statements.
+    """
+    if isinstance(sessions, QuerySet):
+        session_ids = list(sessions.values_list("pk", flat=True))
+    else:
+        session_ids = [getattr(session, "pk", session) for session in sessions]
+    enqueued = 0
+    with transaction.atomic():
+        for start in range(0, len(session_ids), CHUNK_SIZE):
+            chunk = session_ids[start:start + CHUNK_SIZE]
+            Session.objects.filter(pk__in=chunk).update(next_update_number=F("next_update_number") + 1)
+            allocated = Session.objects.filter(pk__in=chunk).values_list("pk", "next_update_number")
+            enqueued += len(SessionUpdate.objects.bulk_create(
+                SessionUpdate(session_id=session_id, update_number=next_number - 1, update_message=message)
+                for session_id, next_number in allocated))
+        get_notification_hub().publish_on_commit(*(session_channel(session_id) for session_id in session_ids))
+    return enqueued
+
+
+def broadcast_update(message, users=None) -> int:
+    """``enqueue_updates`` to every unexpired session, optionally only those of ``users`` (a queryset or ids)."""
+    sessions = Session.objects.filter(expires_at__gt=timezone.now())
+    if users is not None:
+        sessions = sessions.filter(user__in=users)
+    return enqueue_updates(sessions, message)
@@ -4,4 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.Home.as_view(), name='home'),
     path('auth', views.Auth.as_view(), name='auth'),  # temp debug view
+    path('updates', views.UpdateStream.as_view(), name='updates'),
+    path('sodia-button', views.SodiaButton.as_view(), name='sodia_button'),
+    path('sodia-button/stream', views.SodiaButtonStream.as_view(), name='sodia_button_stream'),
 ]
\ No newline at end of file
@@ -1,11 +1,130 @@
+import asyncio
+import json
+
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.csrf import ensure_csrf_cookie
+
+from .models import Session, SessionUpdate
+from .page_cache import cache_page_by_auth
+from .presence import get_presence_service, PRESENCE_CHANNEL
+from .updates import get_notification_hub, session_channel
 
 
 class Home(View):
-    def get(self, request):
+    @cache_page_by_auth(60 * 5)
+    async def get(self, request):
         return render(request, 'users/unauthorised.html')
 
 class Auth(View):  # temp debug view
-    def get(self, request):
-        return render(request, 'users/auth_base.html')
\ No newline at end of file
+    # hosts the Sodia button, whose POSTs need the CSRF cookie; set outside the page cache
+    @method_decorator(ensure_csrf_cookie)
+    @cache_page_by_auth(60 * 5)
+    async def get(self, request):
+        return render(request, 'users/auth_base.html')
+
+
+def event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+class UpdateStream(View):
+    """
+    Server-Sent Events stream of the session's ``SessionUpdate`` queue. Clients resume with
+    ``?update_number=`` or the standard ``Last-Event-ID`` header; everything up to that number
+    counts as delivered and is acknowledged for ``users.gc`` to delete later.
+    """
+    BATCH_SIZE = 100
+    KEEPALIVE = 15
+
+    async def get(self, request):
+        auth = getattr(request, "auth", None)
+        if auth is None or auth.session is None:
+            return HttpResponse(status=401)
+        try:
+            last = int(request.GET.get("update_number", request.headers.get("Last-Event-ID", -1)))
+        except ValueError:
+            return HttpResponseBadRequest("update_number must be an integer")
+        return event_stream_response(self.stream(auth.session, last))
+
+    @staticmethod
+    def event(update_number, message):
+        data = "".join(f"data: {line}\n" for line in message.splitlines() or [""])
+        return f"id: {update_number}\n{data}\n"
+
+    async def stream(self, session, last):
+        if last > session.acknowledged_update_number:
+            await Session.objects.filter(pk=session.pk, acknowledged_update_number__lt=last) \
+                .aupdate(acknowledged_update_number=last)
+        with get_notification_hub().subscribe(session_channel(session.pk)) as subscription:
+            while session.is_valid():
+                # subscribed (and cleared) before reading, so a publish during the read is not lost
+                subscription.clear()
+                updates = SessionUpdate.objects.filter(session=session, update_number__gt=last) \
+                    .order_by("update_number").values_list("update_number", "update_message")[:self.BATCH_SIZE]
+                count = 0
+                async for update_number, message in updates:
+                    yield self.event(update_number, message)
+                    last = update_number
+                    count += 1
+                if count == self.BATCH_SIZE:
+                    continue
+                if not await subscription.wait(self.KEEPALIVE):
+                    # logging out deletes the row; other requests may have slid its expiry forward
+                    expires_at = await Session.objects.filter(pk=session.pk) \
+                        .values_list("expires_at", flat=True).afirst()
+                    if expires_at is None:
+                        return
+                    session.expires_at = expires_at
+                    yield ": keepalive\n\n"
+
+
+class SodiaButton(View):
+    """POST ``action=press`` (also used as the heartbeat while held) or ``action=release``."""
+
+    async def post(self, request):
+        auth = getattr(request, "auth", None)
+        if auth is None or auth.user is None:
+            return HttpResponse(status=401)
+        presence = get_presence_service()
+        action = request.POST.get("action", "press")
+        if action == "press":
+            presence.press(auth.user.pk)
+        elif action == "release":
+            presence.release(auth.user.pk)
+        else:
+            return HttpResponseBadRequest("action must be press or release")
+        return JsonResponse(presence.state(auth.user))
+
+
+class SodiaButtonStream(View):
+    """Server-Sent Events with the live press count and the partner's state, sent whenever they change."""
+    # presses arriving within this window are sent as one event
+    COALESCE = 0.25
+    KEEPALIVE = 15
+
+    async def get(self, request):
+        auth = getattr(request, "auth", None)
+        if auth is None or auth.user is None:
+            return HttpResponse(status=401)
+        return event_stream_response(self.stream(auth.user))
+
+    async def stream(self, user):
+        presence = get_presence_service()
+        last_state = None
+        with get_notification_hub().subscribe(PRESENCE_CHANNEL) as subscription:
+            while True:
+                subscription.clear()
+                state = presence.state(user)
+                if state != last_state:
+                    yield f"data: {json.dumps(state)}\n\n"
+                    last_state = state
+                if await subscription.wait(self.KEEPALIVE):
+                    await asyncio.sleep(self.COALESCE)
+                else:
+                    yield ": keepalive\n\n"